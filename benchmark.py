@@ -0,0 +1,1254 @@
+#!/usr/bin/env python3
+"""
+HN Daily Digest Benchmarks
+──────────────────────────────────────────────────────────────
+Offline benchmarks for generate_daily.py. Network and LLM backends
+are replaced by stubs with fixed latencies, so runs are free,
+reproducible and need no API keys.
+
+    python benchmark.py pipeline --stories 20
+    python benchmark.py profile --stories 20
+    python benchmark.py comments --stories 20
+    python benchmark.py gemini --calls 20
+    python benchmark.py suite --scales 20,100,1000
+    python benchmark.py render --stories 10000
+    python benchmark.py extract --size-mb 5
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import pstats
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import generate_daily as gd
+
+# ── Stubs ─────────────────────────────────────────────────────────────────────
+
+CANNED_ANALYSIS = {
+    "topic_category": "Tech",
+    "summary_paragraphs": ["Stub paragraph one.", "Stub paragraph two."],
+    "highlight": "Stub highlight.",
+    "concise_sentiment": "Stub sentiment.",
+    "key_points": ["a", "b", "c", "d", "e"],
+    "sentiments": [
+        {
+            "label": "Stub cohort",
+            "type": "neutral",
+            "description": "Stub description.",
+            "estimated_agreement": "~10 users",
+        }
+    ],
+}
+
+
+def fake_stories(n: int) -> list:
+    return [
+        {
+            "objectID": str(40_000_000 + i),
+            "title": f"Benchmark story {i}",
+            "url": f"https://example.com/{i}",
+            "points": 1000 - i,
+            "num_comments": 300 // (i + 1),
+        }
+        for i in range(n)
+    ]
+
+
+@contextlib.contextmanager
+def patched(**attrs):
+    """Temporarily replace attributes of the generate_daily module."""
+    saved = {k: getattr(gd, k) for k in attrs}
+    for k, v in attrs.items():
+        setattr(gd, k, v)
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            setattr(gd, k, v)
+
+
+def stub_backends(scrape_s: float, hn_s: float, ai_s: float) -> dict:
+    def fetch_article(url, max_chars=20_000):
+        time.sleep(scrape_s)
+        return f"Article body for {url}"
+
+    def get_top_comments(item_id, max_top=50, max_replies=3):
+        time.sleep(hn_s)
+        return [{"author": "stub", "score": 0, "text": "comment", "replies": []}]
+
+    def call_llm(prompt, cancel=None):
+        time.sleep(ai_s)
+        ids = re.findall(r"── STORY objectID=(\S+)", prompt)
+        if ids:
+            return json.dumps(
+                {"analyses": [{"objectID": i, **CANNED_ANALYSIS} for i in ids]}
+            )
+        return json.dumps(CANNED_ANALYSIS)
+
+    return {
+        "fetch_article": fetch_article,
+        "get_top_comments": get_top_comments,
+        "call_deepseek": call_llm,
+        "call_gemini": call_llm,
+    }
+
+
+@contextlib.contextmanager
+def counting_threads():
+    """Count threads started inside the block; yields a one-item list."""
+    started, original = [0], threading.Thread.start
+
+    def start(self):
+        started[0] += 1
+        original(self)
+
+    threading.Thread.start = start
+    try:
+        yield started
+    finally:
+        threading.Thread.start = original
+
+
+def no_cache() -> gd.DiskCache:
+    cache = gd.DiskCache(gd.CACHE_DIR / "benchmark")
+    cache.read = cache.write = False
+    return cache
+
+
+def no_item_store() -> gd.ItemStore:
+    store = gd.ItemStore(gd.CACHE_DIR / "benchmark.sqlite3")
+    store.read = store.write = False
+    return store
+
+
+def no_store() -> gd.DigestStore:
+    """In-memory story store, so benchmarks never touch data/hn_digest.sqlite3."""
+    return gd.DigestStore(Path(":memory:"))
+
+
+def limiters(rpm: float) -> dict:
+    return {p: gd.RateLimiter(rpm=rpm) for p in gd.DEFAULT_RATE_LIMITS}
+
+
+class StubServer:
+    """Local keep-alive HTTP server answering requests from ``handler(path)``.
+
+    ``handler`` returns ``(status, content_type, body_bytes)``. The server
+    runs in a forked process so its request handling doesn't compete with
+    the code under test for the GIL. Every request sleeps ``latency`` seconds
+    first to mimic a remote round trip, and the server tracks the total and
+    peak in-flight request counts.
+    """
+
+    def __init__(self, handler, latency: float = 0.0):
+        self._counts = multiprocessing.Array("i", 3)  # requests, in flight, peak
+        counts = self._counts
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self.do_GET()
+
+            def do_GET(self):
+                with counts.get_lock():
+                    counts[0] += 1
+                    counts[1] += 1
+                    counts[2] = max(counts[2], counts[1])
+                try:
+                    time.sleep(latency)
+                    status, ctype, body = handler(self.path)
+                    self.send_response(status)
+                    self.send_header("Content-Type", ctype)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client stopped reading early (e.g. streaming cutoff)
+                finally:
+                    with counts.get_lock():
+                        counts[1] -= 1
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.request_queue_size = 256
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self._proc = multiprocessing.get_context("fork").Process(
+            target=self.httpd.serve_forever, daemon=True
+        )
+
+    @property
+    def requests(self) -> int:
+        return self._counts[0]
+
+    @property
+    def peak(self) -> int:
+        return self._counts[2]
+
+    def reset(self) -> None:
+        with self._counts.get_lock():
+            self._counts[0] = self._counts[2] = 0
+
+    def __enter__(self):
+        self._proc.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._proc.terminate()
+        self._proc.join()
+        self.httpd.server_close()
+
+
+# ── Pipeline ──────────────────────────────────────────────────────────────────
+
+
+def serial_loop(stories: list, interval: float) -> None:
+    """The pre-pipeline run() loop with its fixed sleep, kept as the baseline."""
+    for story in stories:
+        hn_id = story.get("objectID", "")
+        article = gd.fetch_article(story.get("url", ""))
+        comments = gd.get_top_comments(int(hn_id)) if hn_id else []
+        try:
+            story["analysis"] = gd.analyze_story(story, article, comments)
+        except Exception:
+            story["analysis"] = gd.fallback_analysis(story)
+        time.sleep(interval)
+
+
+def bench_pipeline(args) -> None:
+    scale = args.scale
+    stubs = stub_backends(args.scrape * scale, args.hn * scale, args.ai * scale)
+    runs = {
+        # The serial loop paced itself with a sleep, not the limiter.
+        "serial": (
+            lambda st: serial_loop(st, args.interval * scale),
+            limiters(rpm=1e9),
+        ),
+        "pipeline": (
+            lambda st: gd.process_stories(st, batch=args.batch),
+            limiters(rpm=args.rpm / scale),
+        ),
+    }
+    results = {}
+    with patched(
+        CONFIG={**gd.CONFIG, "ai_workers": args.ai_workers},
+        ANALYSIS_CACHE=no_cache(),
+        STORE=no_store(),
+        **stubs,
+    ):
+        for name, (fn, limits) in runs.items():
+            stories = fake_stories(args.stories)
+            t0 = time.perf_counter()
+            with patched(_RATE_LIMITERS=limits):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    fn(stories)
+            results[name] = time.perf_counter() - t0
+            assert all(s.get("analysis") for s in stories)
+
+    print(
+        f"  {args.stories} stories | scrape={args.scrape}s hn={args.hn}s "
+        f"ai={args.ai}s | serial sleep={args.interval}s | pipeline "
+        f"rpm={args.rpm} ai_workers={args.ai_workers} batch={args.batch} | "
+        f"time scale x{scale}"
+    )
+    for name, secs in results.items():
+        print(f"  {name:<9} {secs:7.2f}s  (≈{secs / scale:7.1f}s unscaled)")
+    print(f"  speedup   {results['serial'] / results['pipeline']:7.2f}x")
+
+
+def bench_profile(args) -> None:
+    """Smoke run of --profile: a stubbed pipeline with and without RunProfiler."""
+    scale = args.scale
+    stubs = stub_backends(args.scrape * scale, args.hn * scale, args.ai * scale)
+    modes = {"off": None, "per-thread": True, "main-only": False}
+    results = {}
+    with (
+        patched(ANALYSIS_CACHE=no_cache(), STORE=no_store(), **stubs),
+        patched(_RATE_LIMITERS=limiters(rpm=1e9)),
+        tempfile.TemporaryDirectory() as tmp,
+    ):
+        for name, per_thread in modes.items():
+            out = Path(tmp) / name
+            stories = fake_stories(args.stories)
+            if per_thread is None:
+                profiler = contextlib.nullcontext()
+            else:
+                profiler = gd.RunProfiler(out)
+                profiler.PER_THREAD = per_thread
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()), profiler:
+                gd.process_stories(stories)
+            secs = time.perf_counter() - t0
+            assert all(s.get("analysis") for s in stories)
+            if per_thread is None:
+                results[name] = (secs, 0, 0)
+                continue
+            stats = pstats.Stats(str(out / "cpu.pstats"))
+            roots = {
+                line.split(";", 1)[0]
+                for line in (out / "wall.collapsed").read_text().splitlines()
+            }
+            assert stats.total_calls and roots, f"{name}: empty profile"
+            results[name] = (secs, stats.total_calls, len(roots))
+
+    print(f"  {args.stories} stories | time scale x{scale}")
+    for name, (secs, calls, roots) in results.items():
+        print(
+            f"  {name:<10} {secs:7.2f}s  {calls:>8} profiled calls  "
+            f"{roots:>2} sampled thread groups"
+        )
+
+
+# ── Comments ──────────────────────────────────────────────────────────────────
+
+
+def legacy_get_top_comments(item_id: int, max_top: int = 50, max_replies: int = 3):
+    """get_top_comments before the async fetcher: nested per-story thread pools."""
+    item = gd.get_hn_item(item_id)
+    kids = (item.get("kids") or [])[:max_top]
+
+    def fetch_full_comment(kid_id):
+        c = gd.get_hn_item(kid_id)
+        if not c or c.get("dead") or c.get("deleted") or not c.get("text"):
+            return None
+
+        entry = {
+            "author": c.get("by", ""),
+            "score": c.get("score", 0),
+            "text": re.sub(r"<[^>]+>", " ", c.get("text", ""))[:600],
+            "replies": [],
+        }
+
+        r_ids = (c.get("kids") or [])[:max_replies]
+        if r_ids:
+            with ThreadPoolExecutor(max_workers=len(r_ids)) as ex:
+                replies = list(ex.map(gd.get_hn_item, r_ids))
+                for rep in replies:
+                    if rep and not rep.get("dead") and rep.get("text"):
+                        entry["replies"].append(
+                            {
+                                "author": rep.get("by", ""),
+                                "text": re.sub(r"<[^>]+>", " ", rep.get("text", ""))[
+                                    :300
+                                ],
+                            }
+                        )
+        return entry
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        results = list(executor.map(fetch_full_comment, kids))
+
+    return [r for r in results if r]
+
+
+def firebase_tree(kids_per_story: int, replies_per_comment: int):
+    """Handler for a synthetic Firebase tree.
+
+    Story ids are multiples of 10**6, comment ``s + c * 10`` and reply
+    ``s + c * 10 + r`` (r = 1..9). Every 7th comment is deleted. Items are
+    ten days old, i.e. what a backfill sees.
+    """
+    posted = int(time.time()) - 10 * 86400
+
+    def handler(path):
+        item_id = int(re.search(r"/item/(\d+)\.json", path).group(1))
+        story, rest = divmod(item_id, 10**6)
+        if rest == 0:
+            item = {
+                "id": item_id,
+                "type": "story",
+                "kids": [item_id + c * 10 for c in range(1, kids_per_story + 1)],
+            }
+        elif rest % 10 == 0:
+            c = rest // 10
+            item = {
+                "id": item_id,
+                "by": f"user{c}",
+                "text": f"<p>Comment {c}</p>",
+                "kids": [item_id + r for r in range(1, replies_per_comment + 1)],
+            }
+            if c % 7 == 0:
+                item = {"id": item_id, "deleted": True}
+        else:
+            item = {"id": item_id, "by": f"replier{rest}", "text": f"Reply {rest}"}
+        item["time"] = posted
+        return 200, "application/json", json.dumps(item).encode()
+
+    return handler
+
+
+def bench_comments(args) -> None:
+    ids = [(i + 1) * 10**6 for i in range(args.stories)]
+    tmp = tempfile.TemporaryDirectory()
+    store = gd.ItemStore(Path(tmp.name) / "items.sqlite3")
+    runs = {
+        "legacy": (legacy_get_top_comments, no_item_store()),
+        "async": (gd.get_top_comments, no_item_store()),
+        # Same fetcher twice over one persistent store: a first backfill
+        # populates it, a repeat backfill of the same dates reads from it.
+        "store-cold": (gd.get_top_comments, store),
+        "store-warm": (gd.get_top_comments, store),
+    }
+    handler = firebase_tree(args.kids, args.replies)
+    results, outputs = {}, {}
+    with tmp, StubServer(handler, latency=args.latency) as srv:
+        with patched(HN_FIREBASE=f"{srv.url}/v0"):
+            for name, (fn, item_store) in runs.items():
+                srv.reset()
+                t0 = time.perf_counter()
+                with patched(ITEM_STORE=item_store), counting_threads() as started:
+                    with ThreadPoolExecutor(args.workers) as ex:
+                        outputs[name] = list(ex.map(fn, ids))
+                secs = time.perf_counter() - t0
+                results[name] = (secs, srv.requests, srv.peak, started[0])
+
+    for name in runs:
+        assert outputs[name] == outputs["legacy"], f"{name}: comment trees differ"
+    print(
+        f"  {args.stories} stories x {args.kids} comments x {args.replies} replies | "
+        f"{args.workers} comment workers | {args.latency * 1000:.0f} ms/request"
+    )
+    for name, (secs, nreq, peak, threads) in results.items():
+        print(
+            f"  {name:<10} {secs:7.2f}s  {nreq:>5} requests  peak in-flight "
+            f"{peak:<4} threads started {threads}"
+        )
+    print(f"  speedup    {results['legacy'][0] / results['async'][0]:7.2f}x")
+
+
+# ── Gemini ────────────────────────────────────────────────────────────────────
+
+FAKE_GEMINI_CLI = """#!{python}
+import json, sys, time
+time.sleep({startup})
+print(json.dumps({{"response": {reply!r}}}))
+"""
+
+
+def bench_gemini(args) -> None:
+    reply = json.dumps(CANNED_ANALYSIS)
+    body = json.dumps(
+        {"candidates": [{"content": {"parts": [{"text": reply}], "role": "model"}}]}
+    ).encode()
+    sse = b"".join(
+        b"data: "
+        + json.dumps(
+            {"candidates": [{"content": {"parts": [{"text": chunk}]}}]}
+        ).encode()
+        + b"\r\n\r\n"
+        for chunk in (reply[i : i + 64] for i in range(0, len(reply), 64))
+    )
+    prompt = "x" * args.prompt_kb * 1024
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cli = Path(tmp) / "gemini"
+        cli.write_text(
+            FAKE_GEMINI_CLI.format(
+                python=sys.executable, startup=args.cli_startup, reply=reply
+            )
+        )
+        cli.chmod(0o755)
+        os.environ["PATH"] = f"{tmp}{os.pathsep}{os.environ['PATH']}"
+        os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+        def handler(path):
+            if "alt=sse" in path:
+                return 200, "text/event-stream", sse
+            return 200, "application/json", body
+
+        with StubServer(handler) as srv, patched(GEMINI_API_BASE=srv.url):
+            results = {}
+            for name, fn, stream in (
+                ("cli", gd.call_gemini_cli, False),
+                ("api", gd.call_gemini_api, False),
+                ("sse", gd.call_gemini_api, True),
+            ):
+                with patched(STREAM_RESPONSES=stream):
+                    assert fn(prompt) == reply  # warm up + same text contract
+                    t0 = time.perf_counter()
+                    for _ in range(args.calls):
+                        fn(prompt)
+                results[name] = (time.perf_counter() - t0) / args.calls
+
+    print(
+        f"  {args.calls} calls | {args.prompt_kb} KB prompt | fake CLI startup "
+        f"{args.cli_startup}s (real Node CLI startup + auth is far slower)"
+    )
+    for name, secs in results.items():
+        print(f"  {name:<4} {secs * 1000:8.1f} ms/call overhead")
+    print(f"  saved {(results['cli'] - results['api']) * 1000:8.1f} ms/call")
+
+
+# ── Render ────────────────────────────────────────────────────────────────────
+
+
+def legacy_story_card_html(rank: int, story: dict) -> str:
+    """story_card_html before the precompiled templates."""
+    a = story.get("analysis", {})
+    title = escape(story.get("title", "Untitled"))
+    url = escape(story.get("url", "#") or "#")
+    pts = story.get("points", 0)
+    ncmts = story.get("num_comments", 0)
+    hn_id = story.get("objectID", "")
+
+    para_html = "".join(f"<p>{escape(p)}</p>" for p in a.get("summary_paragraphs", []))
+
+    hl = a.get("highlight", "")
+    hl_html = f'<div class="highlight-box"><p>{escape(hl)}</p></div>' if hl else ""
+
+    kps = a.get("key_points", [])
+    kp_html = ""
+    if kps:
+        items = "".join(f"<li>{escape(k)}</li>" for k in kps)
+        kp_html = (
+            f'<div class="key-points">'
+            f'<div class="key-points-title">Key Highlights</div>'
+            f"<ul>{items}</ul></div>"
+        )
+
+    rows = ""
+    for s in a.get("sentiments", []):
+        rc = gd.SENT_CLASS.get(s.get("type", "neutral"), "sent-neutral")
+        rows += (
+            f'<tr class="{rc}">'
+            f"<td>{escape(s.get('label', ''))}</td>"
+            f"<td>{escape(s.get('description', ''))}</td>"
+            f'<td><span class="vote-count">'
+            f"{escape(str(s.get('estimated_agreement', '')))}"
+            "</span></td></tr>"
+        )
+
+    sent_html = ""
+    if rows:
+        sent_html = (
+            f'<div class="sentiment-section">'
+            f'<div class="sentiment-title">Comment Sentiment Analysis - {ncmts} comments</div>'
+            f'<table class="sentiment-table">'
+            f"<thead><tr><th>Sentiment</th><th>Community View</th><th>Agree</th></tr></thead>"
+            f"<tbody>{rows}</tbody></table></div>"
+        )
+
+    return f"""
+<div class="story-card">
+  <div class="story-header">
+    <div class="story-num">#{rank}</div>
+    <div class="story-title"><a href="{url}" target="_blank" rel="noopener">{title}</a></div>
+    <div class="story-meta">
+      <span class="meta-pill">⬆ <span>{pts}</span> pts</span>
+      <span class="meta-pill">💬 <a href="https://news.ycombinator.com/item?id={hn_id}"
+            target="_blank" rel="noopener"><span>{ncmts}</span> HN comments</a></span>
+    </div>
+  </div>
+  <div class="story-body">
+    <div class="story-summary">{para_html}{hl_html}{kp_html}</div>
+    {sent_html}
+  </div>
+</div>"""
+
+
+def legacy_others_table_html(stories: list) -> str:
+    """others_table_html before the precompiled templates."""
+    rows = ""
+    for rank, story in stories:
+        a = story.get("analysis", {})
+        title = escape(story.get("title", ""))
+        url = escape(story.get("url", "#") or "#")
+        pts = story.get("points", 0)
+        ncmts = story.get("num_comments", 0)
+        hn_id = story.get("objectID", "")
+
+        # Build full summary (~200 words)
+        para = " ".join(a.get("summary_paragraphs", []))
+        summary_text = escape(para[:1200] + "..." if len(para) > 1200 else para)
+
+        # Build inline sentiment badges
+        sent_html = ""
+        for s in a.get("sentiments", []):
+            stype = s.get("type", "neutral")
+            slabel = escape(s.get("label", ""))
+            sdesc = escape(s.get("description", ""))
+            agree = escape(str(s.get("estimated_agreement", "")))
+            color = "#5a5446"
+            if stype == "positive":
+                color = "#5a9e6f"
+            elif stype == "negative":
+                color = "#c45c3a"
+            elif stype == "mixed":
+                color = "#d4a017"
+            elif stype == "debate":
+                color = "#8a6bbf"
+
+            sent_html += (
+                f'<div style="margin-top:8px; padding:6px 10px; background:rgba(255,255,255,0.03); border-left:2px solid {color}; border-radius:2px;">'
+                f"<span style=\"font-family:'DM Mono',monospace; font-size:10px; color:{color}; text-transform:uppercase; font-weight:600;\">{slabel}</span> "
+                f'<span style="font-size:11px; color:var(--text-dim); margin-left:6px;">{sdesc}</span> '
+                f"<span style=\"font-family:'DM Mono',monospace; font-size:10px; color:var(--amber); margin-left:8px;\">({agree})</span>"
+                f"</div>"
+            )
+
+        rows += (
+            f"<tr>"
+            f"<td style='width:120px;'>"
+            f"<div class='rank-num' style='margin-bottom:4px'>#{rank}</div>"
+            f"<div class='pts-mono' style='margin-bottom:2px'>{pts} pts</div>"
+            f"<div class='cmts-mono'><a href='https://news.ycombinator.com/item?id={hn_id}' target='_blank'>{ncmts} c</a></div>"
+            f"</td>"
+            f"<td>"
+            f"<div style='margin-bottom:8px;'><a href='{url}' target='_blank' style='font-family:\"Playfair Display\",serif; font-size:1.1rem; font-weight:700; color:var(--text);'>{title}</a></div>"
+            f"<div style='font-size:14px; line-height:1.5; color:#c0b8a8;'>{summary_text}</div>"
+            f"{sent_html}"
+            f"</td>"
+            f"</tr>"
+        )
+    return f"""
+<div class="story-card">
+  <div class="story-body" style="padding:18px 26px">
+    <p style="font-size:14px;color:var(--text-dim);margin-bottom:18px">
+      Remaining stories - comprehensive digest table.
+    </p>
+    <div class="others-table-wrap">
+      <table class="others-table">
+        <thead><tr><th>Stats</th><th>Digest</th></tr></thead>
+        <tbody>{rows}</tbody>
+      </table>
+    </div>
+  </div>
+</div>"""
+
+
+def legacy_wrap_with_layout(
+    title: str, date_str: str, subtitle: str, content: str, navbar_html: str
+) -> str:
+    """wrap_with_layout before the precompiled templates."""
+    model_str = gd.active_model()
+    provider_str = gd.CONFIG["primary_provider"].capitalize()
+
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width,initial-scale=1.0">
+<title>{title}</title>
+<link rel="preconnect" href="https://fonts.googleapis.com">
+<link href="https://fonts.googleapis.com/css2?family=Playfair+Display:ital,wght@0,700;0,900;1,700&family=Source+Serif+4:ital,wght@0,300;0,400;0,600&family=DM+Mono:wght@400;500&display=swap" rel="stylesheet">
+<style>{gd.PAGE_CSS}</style>
+</head>
+<body>
+<div class="masthead">
+  <div class="masthead-sub">Intelligence Briefing</div>
+  <h1>Hacker <span>News</span></h1>
+  <div class="masthead-date">{date_str} - {subtitle}</div>
+  <div class="masthead-rule"></div>
+</div>
+{navbar_html}
+<div class="container">{content}</div>
+<div class="footer">
+  <div class="container">
+    <p>Data: HN Algolia Search + Firebase APIs - Summaries: {model_str} via {provider_str}</p>
+    <p style="margin-top:6px;font-size:10px">
+      Sentiment analysis uses real HN comment threads fetched at generation time.
+      Agreement estimates are inferred from comment upvote distribution and reply volume.
+    </p>
+  </div>
+</div>
+</body>
+</html>"""
+
+
+def legacy_build_index(stories: list, target: date, ranking: str) -> str:
+    """build_index before the precompiled templates."""
+    cats: dict[str, list] = {
+        "AI Fundamentals": [],
+        "AI Applications": [],
+        "Tech": [],
+        "Politics": [],
+        "Others": [],
+    }
+    for i, s in enumerate(stories):
+        cat = s.get("analysis", {}).get("topic_category", "Others")
+        if cat not in cats:
+            cat = "Others"
+        cats[cat].append((i + 1, s))
+
+    sections = ""
+    for cat, items in cats.items():
+        if not items:
+            continue
+        sid, bid = gd.SECTION_ID[cat], gd.BADGE_CLASS[cat]
+        sections += f'<div class="section-header" id="{sid}"><span class="section-badge {bid}">{escape(cat)}</span><div class="section-line"></div></div>\n'
+        if cat == "Others":
+            sections += legacy_others_table_html(items)
+        else:
+            for rank, story in items:
+                sections += legacy_story_card_html(rank, story)
+
+    date_str = target.strftime("%A, %B %d, %Y").upper()
+    navbar_html = gd.get_navbar_html()
+
+    content = f'<div style="margin-top:48px; text-align:center;"><div class="latest-label">Latest Briefing</div></div>{sections}'
+
+    return legacy_wrap_with_layout(
+        title="HN Daily Digest",
+        date_str=date_str,
+        subtitle=f"TOP {len(stories)} - {ranking.upper()}",
+        content=content,
+        navbar_html=navbar_html,
+    )
+
+
+def render_stories(n: int, analyses: list) -> list:
+    """``n`` stories cycling through every card/table/edge case the builders handle."""
+    types = ["positive", "negative", "mixed", "neutral", "debate", "unknown"]
+    cats = list(gd.TOPIC_CATEGORIES) + ["Not a category"]
+    stories = []
+    for i in range(n):
+        a = json.loads(json.dumps(analyses[i % len(analyses)]))
+        a["topic_category"] = cats[i % len(cats)]
+        for j, s in enumerate(a.get("sentiments", [])):
+            s["type"] = types[(i + j) % len(types)]
+            if i % 5 == 0:
+                s["estimated_agreement"] = i  # not a string
+        if i % 3 == 0:
+            a["summary_paragraphs"] = [p * 4 for p in a["summary_paragraphs"]]
+        if i % 11 == 0:
+            a.pop("highlight", None)
+            a["key_points"] = []
+        story = {
+            "objectID": str(40_000_000 + i),
+            "title": f"Story {i} <b>&amp;</b> \"quotes\" 'and' ünïcödé",
+            "url": f"https://example.com/{i}?a=1&b=<2>" if i % 13 else None,
+            "points": 5000 - i,
+            "num_comments": i % 700,
+        }
+        if i % 17:
+            story["analysis"] = a
+        stories.append(story)
+    return stories
+
+
+def visible_text(page: str) -> str:
+    page = re.sub(r"<(style|noscript)>.*?</\1>", "", page, flags=re.S)
+    return " ".join(re.sub(r"<[^>]+>", " ", page).split())
+
+
+def bench_render(args) -> None:
+    analyses = [gd.parse_analysis(raw) for raw in Fixtures().llm]
+    stories = render_stories(args.stories, analyses)
+    day = date(2026, 3, 1)
+
+    results, pages = {}, {}
+    for name, fn in (("legacy", legacy_build_index), ("templates", gd.build_index)):
+        fn(stories[:50], day, "top")  # warm up
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            pages[name] = fn(stories, day, "top")
+        results[name] = (time.perf_counter() - t0) / args.repeat
+
+    # Inline styles became classes in the shared stylesheet, so only the
+    # visible text is still expected to match the legacy page.
+    assert visible_text(pages["templates"]) == visible_text(pages["legacy"]), (
+        "rendered text differs"
+    )
+    print(
+        f"  {args.stories} stories | page {len(pages['legacy']) / 1e6:.1f} MB -> "
+        f"{len(pages['templates']) / 1e6:.1f} MB | same visible text"
+    )
+    for name, secs in results.items():
+        print(
+            f"  {name:<10} {secs * 1000:9.1f} ms  ({args.stories / secs:9.0f} stories/s)"
+        )
+    print(f"  speedup    {results['legacy'] / results['templates']:9.2f}x")
+
+
+# ── Extract ───────────────────────────────────────────────────────────────────
+
+# Markup the regex stripper mangled; the tokenizer is expected to differ here.
+MALFORMED_PAGES = [
+    "<p>if a < b and c > d then</p>",
+    '<a title="x>y">link</a>',
+]
+
+
+def legacy_html_to_text(html: str, max_chars: int = 20_000) -> str:
+    """fetch_article's text extraction before the incremental tokenizer."""
+    text = "".join(ch for ch in html if ch.isprintable() or ch in "\n\r\t")
+    text = re.sub(r"<script[^>]*>.*?</script>", " ", text, flags=re.DOTALL | re.I)
+    text = re.sub(r"<style[^>]*>.*?</style>", " ", text, flags=re.DOTALL | re.I)
+    text = re.sub(r"<[^>]+>", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text[:max_chars]
+
+
+def bench_extract(args) -> None:
+    article = Fixtures().article.decode("utf-8", "replace")
+    pages = [article, *(p.read_text() for p in sorted(gd.OUTPUT_DIR.glob("*.html")))]
+    for page in pages:
+        assert gd.html_to_text(page) == legacy_html_to_text(page), (
+            "extracted text differs"
+        )
+    for page in MALFORMED_PAGES:
+        assert gd.html_to_text(page) != legacy_html_to_text(page), page
+
+    big = article * max(1, args.size_mb * 1_000_000 // len(article))
+    results = {}
+    for name, fn in (("legacy", legacy_html_to_text), ("tokenizer", gd.html_to_text)):
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            fn(big)
+        results[name] = (time.perf_counter() - t0) / args.repeat
+
+    print(
+        f"  {len(pages)} well-formed pages: same text | "
+        f"{len(MALFORMED_PAGES)} malformed: differ as expected"
+    )
+    for page in MALFORMED_PAGES:
+        print(f"  {page!r}")
+        print(f"    legacy    {legacy_html_to_text(page)!r}")
+        print(f"    tokenizer {gd.html_to_text(page)!r}")
+    print(f"  {len(big) / 1e6:.1f} MB page, first 20,000 characters")
+    for name, secs in results.items():
+        print(f"  {name:<10} {secs * 1000:9.1f} ms")
+    print(f"  speedup    {results['legacy'] / results['tokenizer']:9.2f}x")
+
+
+# ── Suite ─────────────────────────────────────────────────────────────────────
+
+BENCH_DIR = Path(__file__).resolve().parent / "benchmarks"
+FIXTURES = BENCH_DIR / "fixtures"
+RESULTS = BENCH_DIR / "results"
+# Replayed Firebase ids are offset by story index * ID_STRIDE, so every
+# simulated story gets its own copy of one of the recorded comment trees.
+ID_STRIDE = 10**9
+SUITE_DAY = date(2026, 3, 1)
+
+
+class Fixtures:
+    """Recorded Algolia, Firebase, article and LLM responses.
+
+    ``server(n)`` replays them as a day of ``n`` stories: Algolia hits are
+    cycled (and paginated by ``hitsPerPage``/``page``), story k gets recorded
+    comment tree ``k % trees`` under its own id range, and every story URL
+    points at the recorded article on the same stub server.
+    """
+
+    def __init__(self, root: Path = FIXTURES):
+        self.algolia = json.loads((root / "algolia_search.json").read_text())
+        self.items = {
+            int(k): v
+            for k, v in json.loads((root / "firebase_items.json").read_text()).items()
+        }
+        self.article = (root / "article.html").read_bytes()
+        self.llm = json.loads((root / "llm_responses.json").read_text())
+        self.trees = sorted(
+            i for i, v in self.items.items() if v.get("type") == "story"
+        )
+
+    def hits(self, n: int, base_url: str) -> list:
+        recorded = self.algolia["hits"]
+        hits = []
+        for k in range(n):
+            story_id = self.trees[k % len(self.trees)] + k * ID_STRIDE
+            hits.append(
+                {
+                    **recorded[k % len(recorded)],
+                    "objectID": str(story_id),
+                    "story_id": story_id,
+                    "url": f"{base_url}/article/{k}",
+                }
+            )
+        return hits
+
+    def item(self, item_id: int) -> dict | None:
+        k, recorded = divmod(item_id, ID_STRIDE)
+        item = self.items.get(recorded)
+        if item is None:
+            return None
+        shift = k * ID_STRIDE
+        item = {**item, "id": item_id}
+        if "kids" in item:
+            item["kids"] = [kid + shift for kid in item["kids"]]
+        if "parent" in item:
+            item["parent"] += shift
+        return item
+
+    def respond(self, path: str, hits: list) -> tuple:
+        parts = urlsplit(path)
+        if parts.path.endswith("/search"):
+            query = parse_qs(parts.query)
+            per_page = int(query.get("hitsPerPage", ["20"])[0])
+            page = int(query.get("page", ["0"])[0])
+            body = {
+                **self.algolia,
+                "hits": hits[page * per_page : (page + 1) * per_page],
+                "nbHits": len(hits),
+                "nbPages": -(-len(hits) // per_page),
+                "page": page,
+                "hitsPerPage": per_page,
+            }
+            return 200, "application/json", json.dumps(body).encode()
+        m = re.search(r"/item/(\d+)\.json", parts.path)
+        if m:
+            return (
+                200,
+                "application/json",
+                json.dumps(self.item(int(m.group(1)))).encode(),
+            )
+        if parts.path.startswith("/article/"):
+            return 200, "text/html; charset=utf-8", self.article
+        return 404, "text/plain", b"not found"
+
+    def server(self, n: int, latency: float = 0.0) -> StubServer:
+        """StubServer replaying a day of ``n`` stories; start it with ``with``."""
+        hits = []
+        srv = StubServer(lambda path: self.respond(path, hits), latency)
+        hits.extend(self.hits(n, srv.url))  # filled in before the server forks
+        return srv
+
+
+def timed_map(fn, items: list, workers: int) -> tuple:
+    """``fn`` over ``items`` on a pool; returns (results, wall seconds, latencies)."""
+    latencies = []
+
+    def call(item):
+        t0 = time.perf_counter()
+        result = fn(item)
+        latencies.append(time.perf_counter() - t0)
+        return result
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(workers) as ex:
+        results = list(ex.map(call, items))
+    return results, time.perf_counter() - t0, latencies
+
+
+def result_row(bench: str, stories: int, wall: float, latencies: list, **extra) -> dict:
+    return {
+        "bench": bench,
+        "stories": stories,
+        "seconds": round(wall, 4),
+        "stories_per_s": round(stories / wall, 1),
+        "p50_ms": round(gd.percentile(latencies, 0.5) * 1000, 3),
+        "p95_ms": round(gd.percentile(latencies, 0.95) * 1000, 3),
+        **extra,
+    }
+
+
+def suite_scale(fx: Fixtures, n: int, args) -> list:
+    """Every suite benchmark at ``n`` stories against a fresh stub server.
+
+    Later stages run on whatever get_stories_for_date returned, so their
+    ``stories`` can be below ``n`` (the row's ``scale``) if it caps the list.
+    """
+    rows = []
+    with (
+        fx.server(n, latency=args.latency) as srv,
+        patched(
+            HN_ALGOLIA=f"{srv.url}/api/v1/search",
+            HN_FIREBASE=f"{srv.url}/v0",
+            ITEM_STORE=no_item_store(),
+            ARTICLE_CACHE=no_cache(),
+            STORE=no_store(),
+        ),
+        contextlib.redirect_stdout(io.StringIO()),
+    ):
+        latencies, stories = [], []
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            t1 = time.perf_counter()
+            stories = gd.get_stories_for_date(SUITE_DAY, n=n)
+            latencies.append(time.perf_counter() - t1)
+        wall = (time.perf_counter() - t0) / args.repeat
+        rows.append(
+            result_row(
+                "get_stories_for_date", n, wall, latencies, returned=len(stories)
+            )
+        )
+
+        ids = [int(s["objectID"]) for s in stories]
+        srv.reset()
+        trees, wall, latencies = timed_map(
+            gd.get_top_comments, ids, gd.CONFIG.get("comment_workers", 4)
+        )
+        rows.append(
+            result_row(
+                "get_top_comments",
+                len(ids),
+                wall,
+                latencies,
+                comments=sum(len(t) for t in trees),
+                requests=srv.requests,
+            )
+        )
+
+        urls = [s["url"] for s in stories]
+        srv.reset()
+        articles, wall, latencies = timed_map(
+            gd.fetch_article, urls, gd.CONFIG.get("scrape_workers", 8)
+        )
+        rows.append(
+            result_row(
+                "fetch_article",
+                len(urls),
+                wall,
+                latencies,
+                chars=sum(len(a) for a in articles),
+                requests=srv.requests,
+            )
+        )
+
+    latencies = []
+    t0 = time.perf_counter()
+    analyses = []
+    for k in range(n):
+        t1 = time.perf_counter()
+        analyses.append(
+            gd.validate_analysis(gd.parse_analysis(fx.llm[k % len(fx.llm)]))
+        )
+        latencies.append(time.perf_counter() - t1)
+    rows.append(
+        result_row("analyze_story parse", n, time.perf_counter() - t0, latencies)
+    )
+
+    day = [
+        {**hit, "analysis": analysis}
+        for hit, analysis in zip(fx.hits(n, "https://example.com"), analyses)
+    ]
+    latencies, html = [], ""
+    for _ in range(args.repeat):
+        t1 = time.perf_counter()
+        html = gd.build_index(day, SUITE_DAY, "top")
+        latencies.append(time.perf_counter() - t1)
+    rows.append(
+        result_row(
+            "build_index", n, sum(latencies) / args.repeat, latencies, bytes=len(html)
+        )
+    )
+    return [{"scale": n, **row} for row in rows]
+
+
+def git_revision() -> str:
+    """Short HEAD hash, suffixed ``-dirty`` when tracked files are modified."""
+    try:
+        rev = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{rev}-dirty" if dirty else rev
+
+
+def bench_suite(args) -> None:
+    fx = Fixtures()
+    scales = [int(s) for s in args.scales.split(",")]
+    baseline = {}
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text())
+        baseline = {(r["bench"], r["scale"]): r for r in previous["results"]}
+        print(f"  compared with {previous['revision']} ({args.compare})")
+
+    rows = []
+    for n in scales:
+        rows.extend(suite_scale(fx, n, args))
+
+    revision = git_revision()
+    report = {
+        "revision": revision,
+        "python": sys.version.split()[0],
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "latency_s": args.latency,
+        "results": rows,
+    }
+    RESULTS.mkdir(parents=True, exist_ok=True)
+    out = RESULTS / f"{revision}.json"
+    out.write_text(json.dumps(report, indent=2) + "\n")
+
+    print(
+        f"  {'benchmark':<22}{'scale':>6}{'stories':>8}{'seconds':>10}{'stories/s':>11}"
+        f"{'p50 ms':>10}{'p95 ms':>10}"
+    )
+    for r in rows:
+        line = (
+            f"  {r['bench']:<22}{r['scale']:>6}{r['stories']:>8}{r['seconds']:>10.3f}"
+            f"{r['stories_per_s']:>11.1f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+        )
+        before = baseline.get((r["bench"], r["scale"]))
+        if before:
+            line += f"  {(r['seconds'] / before['seconds'] - 1) * 100:+6.1f}%"
+        print(line)
+    print(f"  ✔ {out}")
+
+
+def record(args) -> None:
+    """Refresh the fixtures from the live APIs (and, with --llm, a real model)."""
+    target = date.fromisoformat(args.date)
+    FIXTURES.mkdir(parents=True, exist_ok=True)
+
+    start = int(
+        datetime(target.year, target.month, target.day, tzinfo=timezone.utc).timestamp()
+    )
+    r = gd.HTTP.get(
+        gd.HN_ALGOLIA,
+        params={
+            "tags": "front_page",
+            "numericFilters": f"created_at_i>={start},created_at_i<{start + 86400}",
+            "hitsPerPage": 100,
+        },
+    )
+    r.raise_for_status()
+    search = r.json()
+    (FIXTURES / "algolia_search.json").write_text(json.dumps(search, indent=1))
+    hits = sorted(search["hits"], key=lambda h: -h.get("points", 0))
+
+    def item(item_id):
+        r = gd.HTTP.get(f"{gd.HN_FIREBASE}/item/{item_id}.json")
+        r.raise_for_status()
+        return r.json()
+
+    items = {}
+    for hit in hits[: args.trees]:
+        story = items.setdefault(int(hit["objectID"]), item(hit["objectID"]))
+        with ThreadPoolExecutor(16) as ex:
+            comments = list(ex.map(item, (story.get("kids") or [])[:50]))
+            replies = [kid for c in comments if c for kid in (c.get("kids") or [])[:3]]
+            items.update({c["id"]: c for c in comments if c})
+            items.update({rep["id"]: rep for rep in ex.map(item, replies) if rep})
+    (FIXTURES / "firebase_items.json").write_text(
+        json.dumps({str(k): v for k, v in sorted(items.items())}, indent=1)
+    )
+
+    for hit in hits:
+        if not hit.get("url"):
+            continue
+        try:
+            r = gd.HTTP.get(hit["url"])
+        except Exception:
+            continue
+        if r.ok and gd.is_text_content(r.headers.get("Content-Type", "")):
+            (FIXTURES / "article.html").write_bytes(r.content[: gd.MAX_ARTICLE_BYTES])
+            break
+
+    if args.llm:
+        responses = []
+        for hit in hits[: args.llm]:
+            article = gd.fetch_article(hit.get("url", ""))
+            comments = gd.get_top_comments(int(hit["objectID"]))
+            prompt = gd.build_prompt(hit, article, gd.format_comments(comments))
+            responses.append(gd.call_ai(prompt))
+        (FIXTURES / "llm_responses.json").write_text(
+            json.dumps(responses, indent=1, ensure_ascii=False)
+        )
+    print(f"  ✔ fixtures for {target} → {FIXTURES}")
+
+
+# ── Entry Point ───────────────────────────────────────────────────────────────
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = ap.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("pipeline", help="serial loop vs. staged pipeline in run()")
+    p.add_argument("--stories", default=20, type=int)
+    p.add_argument("--scrape", default=1.5, type=float, help="article fetch latency")
+    p.add_argument("--hn", default=2.0, type=float, help="comment fetch latency")
+    p.add_argument("--ai", default=8.0, type=float, help="LLM call latency")
+    p.add_argument("--interval", default=2.0, type=float, help="serial loop sleep")
+    p.add_argument("--rpm", default=15, type=float, help="pipeline rate limit")
+    p.add_argument("--ai-workers", default=gd.CONFIG.get("ai_workers", 1), type=int)
+    p.add_argument("--batch", action="store_true", help="batch low-engagement stories")
+    p.add_argument("--scale", default=0.05, type=float, help="latency multiplier")
+    p.set_defaults(func=bench_pipeline)
+
+    p = sub.add_parser("profile", help="smoke run of --profile on a stubbed pipeline")
+    p.add_argument("--stories", default=20, type=int)
+    p.add_argument("--scrape", default=1.5, type=float, help="article fetch latency")
+    p.add_argument("--hn", default=2.0, type=float, help="comment fetch latency")
+    p.add_argument("--ai", default=8.0, type=float, help="LLM call latency")
+    p.add_argument("--scale", default=0.01, type=float, help="latency multiplier")
+    p.set_defaults(func=bench_profile)
+
+    p = sub.add_parser("comments", help="nested thread pools vs. async comment fetcher")
+    p.add_argument("--stories", default=20, type=int)
+    p.add_argument("--kids", default=50, type=int, help="top-level comments per story")
+    p.add_argument("--replies", default=3, type=int, help="replies per comment")
+    p.add_argument("--latency", default=0.02, type=float, help="seconds per request")
+    p.add_argument("--workers", default=gd.CONFIG.get("comment_workers", 4), type=int)
+    p.set_defaults(func=bench_comments)
+
+    p = sub.add_parser("gemini", help="per-call overhead: Gemini CLI vs. HTTP API")
+    p.add_argument("--calls", default=20, type=int)
+    p.add_argument("--prompt-kb", default=20, type=int)
+    p.add_argument(
+        "--cli-startup", default=0.0, type=float, help="extra startup per CLI spawn"
+    )
+    p.set_defaults(func=bench_gemini)
+
+    p = sub.add_parser(
+        "render", help="string-concat renderers vs. precompiled templates"
+    )
+    p.add_argument("--stories", default=10_000, type=int)
+    p.add_argument("--repeat", default=3, type=int)
+    p.set_defaults(func=bench_render)
+
+    p = sub.add_parser("extract", help="regex stripper vs. incremental HTML tokenizer")
+    p.add_argument("--size-mb", default=5, type=int, help="page size for timing")
+    p.add_argument("--repeat", default=3, type=int)
+    p.set_defaults(func=bench_extract)
+
+    p = sub.add_parser(
+        "suite", help="replay recorded fixtures through each pipeline stage"
+    )
+    p.add_argument(
+        "--scales", default="20,100,1000", help="comma-separated story counts"
+    )
+    p.add_argument("--latency", default=0.0, type=float, help="seconds per request")
+    p.add_argument(
+        "--repeat", default=3, type=int, help="runs of the single-call stages"
+    )
+    p.add_argument(
+        "--compare", default=None, help="earlier results JSON to diff against"
+    )
+    p.set_defaults(func=bench_suite)
+
+    p = sub.add_parser("record", help="refresh benchmarks/fixtures from the live APIs")
+    p.add_argument("--date", required=True, help="day to record (YYYY-MM-DD)")
+    p.add_argument("--trees", default=3, type=int, help="comment trees to record")
+    p.add_argument(
+        "--llm", default=0, type=int, help="also record N real LLM responses"
+    )
+    p.set_defaults(func=record)
+
+    args = ap.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
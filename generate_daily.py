@@ -8,16 +8,41 @@ AI (Gemini or DeepSeek) for each story to produce deep reports.
 
 import os
 import re
+import sys
 import json
 import time
+import random
+import asyncio
+import codecs
+import sqlite3
+import hashlib
 import argparse
+import calendar
+import cProfile
+import pstats
+import threading
+import shutil
 import subprocess
 import textwrap
+import gzip
 import requests
+from collections import defaultdict, deque
+from contextlib import contextmanager, nullcontext
 from datetime import date, datetime, timezone, timedelta
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 from html import escape
-from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+try:
+    import brotli
+except ImportError:  # optional: only .gz siblings are written without it
+    brotli = None
 
 # ── Configuration ─────────────────────────────────────────────────────────────
 
@@ -37,7 +62,771 @@ def load_config():
 CONFIG = load_config()
 OUTPUT_DIR = Path("site")
 OUTPUT_DIR.mkdir(exist_ok=True)
-MANIFEST = OUTPUT_DIR / "manifest.json"
+CACHE_DIR = Path(".cache")
+
+
+def active_model(provider: str | None = None) -> str:
+    if (provider or CONFIG["primary_provider"]) == "deepseek":
+        return CONFIG["deepseek_model"]
+    return CONFIG["gemini_model"]
+
+
+# ── Metrics ───────────────────────────────────────────────────────────────────
+
+
+def percentile(samples, q: float) -> float | None:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+class Metrics:
+    """Thread-safe run metrics: sample series (timings, sizes) and counters.
+
+    Both are keyed by name plus optional labels such as ``stage=``, ``host=``
+    or ``provider=``. ``report()`` summarises every series as count, sum,
+    min, p50, p95 and max; ``write()`` saves that as JSON and, optionally, as
+    a Prometheus textfile (series become summaries, counters ``_total``).
+    """
+
+    PREFIX = "hn_digest_"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.counters = defaultdict(float)
+        self.started = time.time()
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self.samples[name, tuple(sorted(labels.items()))].append(value)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        with self._lock:
+            self.counters[name, tuple(sorted(labels.items()))] += value
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Record the duration of the block as ``stage_seconds{stage=...}``."""
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.monotonic() - t0, stage=stage)
+
+    def report(self) -> dict:
+        with self._lock:
+            samples = {k: sorted(v) for k, v in self.samples.items()}
+            counters = dict(self.counters)
+        return {
+            "series": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": len(values),
+                    "sum": round(sum(values), 4),
+                    "min": round(values[0], 4),
+                    "p50": round(percentile(values, 0.5), 4),
+                    "p95": round(percentile(values, 0.95), 4),
+                    "max": round(values[-1], 4),
+                }
+                for (name, labels), values in sorted(samples.items())
+            ],
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(counters.items())
+            ],
+        }
+
+    def prometheus(self, report: dict) -> str:
+        def series(name, labels, **extra):
+            pairs = {**labels, **extra}
+            inner = ",".join(f'{k}="{v}"' for k, v in pairs.items())
+            return f"{self.PREFIX}{name}" + (f"{{{inner}}}" if inner else "")
+
+        lines, typed = [], set()
+        for s in report["series"]:
+            if s["name"] not in typed:
+                typed.add(s["name"])
+                lines.append(f"# TYPE {self.PREFIX}{s['name']} summary")
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95")):
+                name = series(s["name"], s["labels"], quantile=quantile)
+                lines.append(f"{name} {s[key]}")
+            lines.append(f"{series(s['name'] + '_sum', s['labels'])} {s['sum']}")
+            lines.append(f"{series(s['name'] + '_count', s['labels'])} {s['count']}")
+        for c in report["counters"]:
+            name = f"{c['name']}_total"
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {self.PREFIX}{name} counter")
+            lines.append(f"{series(name, c['labels'])} {c['value']:g}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory: Path, run: dict, prometheus: bool = False) -> Path:
+        """Write ``run-report.json`` (and ``hn_digest.prom``) atomically."""
+        directory.mkdir(parents=True, exist_ok=True)
+        report = {
+            "run": {**run, "wall_seconds": round(time.time() - self.started, 2)},
+            **self.report(),
+        }
+        outputs = {"run-report.json": json.dumps(report, indent=2)}
+        if prometheus:
+            outputs["hn_digest.prom"] = self.prometheus(report)
+        for name, text in outputs.items():
+            tmp = directory / f".{name}.tmp"
+            tmp.write_text(text, encoding="utf-8")
+            os.replace(tmp, directory / name)
+        return directory / "run-report.json"
+
+
+METRICS = Metrics()
+
+
+# ── Local Caches ──────────────────────────────────────────────────────────────
+
+
+def content_key(*parts) -> str:
+    """Stable SHA-256 over JSON-serialisable parts."""
+    blob = json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """Directory of JSON entries keyed by hash, with age and size eviction.
+
+    A hit refreshes the entry's mtime, so mtime is the last-use time: entries
+    idle for longer than ``max_age_days`` are dropped, then the least recently
+    used ones go until the directory fits in ``max_mb``. ``read``/``write``
+    implement the --refresh and --no-cache switches.
+    """
+
+    def __init__(self, root: Path, max_age_days: float = 30, max_mb: float = 200):
+        self.root = root
+        self.max_age = max_age_days * 86400
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.read = self.write = True
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, *keys: str):
+        """First entry found under any of ``keys``; counts one hit or miss."""
+        if not self.read:
+            return None
+        for key in keys:
+            path = self._path(key)
+            try:
+                value = json.loads(path.read_text(encoding="utf-8"))
+                os.utime(path)
+            except (OSError, ValueError):
+                continue
+            with self._lock:
+                self.hits += 1
+            return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value) -> None:
+        if not self.write:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(value, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def evict(self) -> int:
+        """Apply the age and size limits; return the number of entries removed."""
+        if not self.root.exists():
+            return 0
+        now = time.time()
+        entries, removed = [], 0
+        for path in self.root.glob("*/*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            if now - st.st_mtime > self.max_age:
+                path.unlink(missing_ok=True)
+                removed += 1
+            else:
+                entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+
+def make_cache(name: str, **defaults) -> DiskCache:
+    """DiskCache under CACHE_DIR, overridable via config.json ``<name>_cache``."""
+    conf = {**defaults, **CONFIG.get(f"{name}_cache", {})}
+    return DiskCache(CACHE_DIR / name, **conf)
+
+
+ANALYSIS_CACHE = make_cache("analysis", max_age_days=30, max_mb=200)
+ARTICLE_CACHE = make_cache("articles", max_age_days=14, max_mb=100)
+
+
+class ItemStore:
+    """SQLite store of HN Firebase items keyed by item id.
+
+    Comments stop changing a few days after they are posted, so an item whose
+    age (at fetch time) exceeds ``frozen_after_hours`` is never refetched.
+    Younger items stay fresh for a quarter of their age at fetch time, but
+    at least ``min_ttl_minutes``, so a 1-day-old story is rechecked after
+    ~6 hours. Rows fetched more than ``max_age_days`` ago are pruned by
+    ``evict()``.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        frozen_after_hours: float = 72,
+        min_ttl_minutes: float = 15,
+        max_age_days: float = 90,
+    ):
+        self.path = path
+        self.frozen_after = frozen_after_hours * 3600
+        self.min_ttl = min_ttl_minutes * 60
+        self.max_age = max_age_days * 86400
+        self.read = self.write = True
+        self.hits = self.misses = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS items ("
+                " id INTEGER PRIMARY KEY, data TEXT NOT NULL,"
+                " item_time INTEGER, fetched_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _fresh(self, item_time: int | None, fetched_at: float, now: float) -> bool:
+        age_at_fetch = fetched_at - (item_time or fetched_at)
+        if age_at_fetch >= self.frozen_after:
+            return True
+        return now - fetched_at < max(age_at_fetch / 4, self.min_ttl)
+
+    def get_many(self, ids: list) -> dict:
+        """Fresh stored items among ``ids``, as ``{id: item}``."""
+        if not self.read or not ids:
+            return {}
+        now, found = time.time(), {}
+        with self._lock:
+            db = self._db()
+            for start in range(0, len(ids), 500):
+                chunk = ids[start : start + 500]
+                rows = db.execute(
+                    "SELECT id, data, item_time, fetched_at FROM items"
+                    f" WHERE id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for item_id, data, item_time, fetched_at in rows:
+                    if self._fresh(item_time, fetched_at, now):
+                        found[item_id] = json.loads(data)
+            self.hits += len(found)
+            self.misses += len(set(ids)) - len(found)
+        return found
+
+    def get(self, item_id: int) -> dict | None:
+        return self.get_many([item_id]).get(item_id)
+
+    def put(self, item_id: int, item: dict) -> None:
+        if not self.write or not item:
+            return
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?)",
+                (item_id, json.dumps(item), item.get("time"), time.time()),
+            )
+
+    def evict(self) -> int:
+        if self._conn is None and not self.path.exists():
+            return 0
+        with self._lock:
+            cur = self._db().execute(
+                "DELETE FROM items WHERE fetched_at < ?", (time.time() - self.max_age,)
+            )
+            return cur.rowcount
+
+
+ITEM_STORE = ItemStore(CACHE_DIR / "hn_items.sqlite3", **CONFIG.get("item_store", {}))
+
+# ── Story Store ───────────────────────────────────────────────────────────────
+
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stories (
+    object_id TEXT PRIMARY KEY, date TEXT NOT NULL, title TEXT, url TEXT,
+    points INTEGER, num_comments INTEGER, created_at INTEGER, hit TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS listings (
+    date TEXT NOT NULL, ranking TEXT NOT NULL, rank INTEGER NOT NULL,
+    object_id TEXT NOT NULL, PRIMARY KEY (date, ranking, rank));
+CREATE TABLE IF NOT EXISTS articles (
+    url TEXT PRIMARY KEY, text_hash TEXT NOT NULL, chars INTEGER NOT NULL,
+    fetched_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS comments (
+    object_id TEXT PRIMARY KEY, snapshot TEXT NOT NULL, fetched_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS analyses (
+    object_id TEXT PRIMARY KEY, topic_category TEXT, analysis TEXT NOT NULL,
+    provider TEXT, model TEXT, prompt_version INTEGER, analysed_at REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS stories_date ON stories (date);
+CREATE INDEX IF NOT EXISTS stories_points ON stories (points);
+CREATE INDEX IF NOT EXISTS listings_object ON listings (object_id);
+CREATE INDEX IF NOT EXISTS analyses_topic ON analyses (topic_category);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    object_id TEXT PRIMARY KEY, canonical_url TEXT, simhash INTEGER,
+    b0 INTEGER, b1 INTEGER, b2 INTEGER, b3 INTEGER, seen_at REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS fingerprints_url ON fingerprints (canonical_url);
+CREATE INDEX IF NOT EXISTS fingerprints_b0 ON fingerprints (b0);
+CREATE INDEX IF NOT EXISTS fingerprints_b1 ON fingerprints (b1);
+CREATE INDEX IF NOT EXISTS fingerprints_b2 ON fingerprints (b2);
+CREATE INDEX IF NOT EXISTS fingerprints_b3 ON fingerprints (b3);
+"""
+
+# Cross-day deduplication: a story whose canonical URL, or whose article text
+# (by SimHash), matches one analysed within ``max_age_days`` reuses that
+# summary and only gets fresh comment sentiment.
+DEDUP = {
+    "enabled": True,
+    "max_age_days": 7,
+    "max_distance": 3,
+    **CONFIG.get("dedup", {}),
+}
+TRACKING_PARAMS = re.compile(
+    r"^(utm_\w+|ref|ref_src|source|fbclid|gclid|mc_cid|mc_eid|igshid|si)$", re.I
+)
+SIMHASH_MIN_WORDS = 50
+
+
+def canonical_url(url: str) -> str:
+    """URL with scheme, host prefixes, tracking parameters and slashes normalised."""
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    host = re.sub(r"^(www|m|mobile|amp)\.", "", host)
+    path = re.sub(r"/(index\.html?|amp)?/*$", "", parts.path) or ""
+    query = urlencode(
+        sorted(
+            (k, v)
+            for k, v in parse_qsl(parts.query, keep_blank_values=True)
+            if not TRACKING_PARAMS.match(k)
+        )
+    )
+    return f"{host}{path}" + (f"?{query}" if query else "")
+
+
+def simhash(text: str) -> int | None:
+    """64-bit SimHash over word 3-shingles, or None for very short texts."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SIMHASH_MIN_WORDS:
+        return None
+    shingles = {" ".join(words[i : i + 3]) for i in range(len(words) - 2)}
+    bits = [
+        f"{int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), 'big'):064b}"
+        for s in shingles
+    ]
+    fp = 0
+    for column in zip(*bits):
+        fp = (fp << 1) | (column.count("1") * 2 > len(bits))
+    return fp
+
+
+def _signed64(h: int) -> int:
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+class DigestStore:
+    """SQLite store of everything a run produced; re-renders read from it.
+
+    It holds Algolia story metadata, the daily listings (which stories each
+    page showed, in order), a hash of each article text, the comment
+    snapshot given to the LLM, and the analysis. Inputs are buffered during
+    the run. ``save()`` writes them together with the stories and analyses
+    in one transaction of bulk inserts, so the pipeline never waits on the
+    database.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.write = True
+        self._conn = None
+        self._lock = threading.Lock()
+        self._articles: dict[str, tuple] = {}
+        self._comments: dict[str, tuple] = {}
+        self._fingerprints: dict[str, tuple] = {}
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(STORE_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def record_inputs(self, story: dict, article: str, comments: list) -> None:
+        now = time.time()
+        oid = str(story.get("objectID", ""))
+        text_hash = hashlib.sha256(article.encode("utf-8")).hexdigest()
+        fp = simhash(article)
+        bands = (
+            [fp >> shift & 0xFFFF for shift in (48, 32, 16, 0)]
+            if fp is not None
+            else [None] * 4
+        )
+        with self._lock:
+            if story.get("url") and article:
+                self._articles[story["url"]] = (text_hash, len(article), now)
+            self._fingerprints[oid] = (
+                canonical_url(story.get("url", "")) or None,
+                None if fp is None else _signed64(fp),
+                *bands,
+                now,
+            )
+            self._comments[str(story.get("objectID", ""))] = (
+                json.dumps(comments, ensure_ascii=False),
+                now,
+            )
+
+    def save(self, reports: list, ranking: str) -> int:
+        """Store (date, stories) listings plus buffered inputs; returns stories."""
+        if not self.write:
+            return 0
+        now = time.time()
+        stories, listings, analyses = {}, [], {}
+        for day, day_stories in reports:
+            for rank, s in enumerate(day_stories, 1):
+                oid = str(s.get("objectID", ""))
+                hit = {k: v for k, v in s.items() if k != "analysis"}
+                created = s.get("created_at_i") or 0
+                stories[oid] = (
+                    oid,
+                    str(datetime.fromtimestamp(created, timezone.utc).date()),
+                    s.get("title"),
+                    s.get("url"),
+                    s.get("points"),
+                    s.get("num_comments"),
+                    created,
+                    json.dumps(hit, ensure_ascii=False),
+                )
+                listings.append((str(day), ranking, rank, oid))
+                a = s.get("analysis")
+                if a:
+                    analyses[oid] = (
+                        oid,
+                        a.get("topic_category"),
+                        json.dumps(a, ensure_ascii=False),
+                        a.get("provider") or CONFIG["primary_provider"],
+                        a.get("model") or active_model(a.get("provider")),
+                        PROMPT_VERSION,
+                        now,
+                    )
+        with self._lock:
+            articles = [(url, *v) for url, v in self._articles.items()]
+            comments = [(oid, *v) for oid, v in self._comments.items()]
+            fingerprints = [(oid, *v) for oid, v in self._fingerprints.items()]
+            self._articles, self._comments, self._fingerprints = {}, {}, {}
+            db = self._db()
+            db.execute("BEGIN")
+            try:
+                db.executemany(
+                    "DELETE FROM listings WHERE date = ? AND ranking = ?",
+                    {(str(day), ranking) for day, _ in reports},
+                )
+                db.executemany(
+                    "INSERT OR REPLACE INTO stories VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    stories.values(),
+                )
+                db.executemany("INSERT INTO listings VALUES (?, ?, ?, ?)", listings)
+                db.executemany(
+                    "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    analyses.values(),
+                )
+                db.executemany(
+                    "INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?)", articles
+                )
+                db.executemany(
+                    "INSERT OR REPLACE INTO comments VALUES (?, ?, ?)", comments
+                )
+                db.executemany(
+                    "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    fingerprints,
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return len(stories)
+
+    def _twins(self, where: str, args: tuple, story: dict) -> list:
+        """Analysed stories matching ``where`` posted up to max_age_days before ``story``.
+
+        The window is on story dates, not on when the fingerprints were
+        written, so a backfill of old dates never borrows from later days.
+        """
+        until = story.get("created_at_i") or int(time.time())
+        since = until - DEDUP["max_age_days"] * 86400
+        with self._lock:
+            return (
+                self._db()
+                .execute(
+                    "SELECT f.object_id, f.simhash, a.analysis FROM fingerprints f"
+                    " JOIN analyses a ON a.object_id = f.object_id"
+                    " JOIN stories s ON s.object_id = f.object_id"
+                    f" WHERE ({where}) AND s.created_at BETWEEN ? AND ?"
+                    " AND f.object_id != ?"
+                    " AND json_extract(a.analysis, '$.fallback') IS NULL"
+                    " ORDER BY s.created_at DESC",
+                    (*args, since, until, str(story.get("objectID"))),
+                )
+                .fetchall()
+            )
+
+    def twin_by_url(self, story: dict) -> tuple | None:
+        """(objectID, analysis, "url") of a recent story with the same canonical URL."""
+        canon = canonical_url(story.get("url", ""))
+        if not DEDUP["enabled"] or not canon:
+            return None
+        rows = self._twins("f.canonical_url = ?", (canon,), story)
+        return (rows[0][0], json.loads(rows[0][2]), "url") if rows else None
+
+    def twin(self, story: dict, article: str) -> tuple | None:
+        """Like twin_by_url, falling back to the nearest SimHash of the article text.
+
+        Four 16-bit bands are indexed. Two hashes within 3 bits of each other
+        always share at least one band, so only those candidates are compared.
+        """
+        found = self.twin_by_url(story)
+        fp = simhash(article) if DEDUP["enabled"] and not found else None
+        if fp is None:
+            return found
+        bands = [fp >> shift & 0xFFFF for shift in (48, 32, 16, 0)]
+        rows = self._twins(
+            "f.b0 = ? OR f.b1 = ? OR f.b2 = ? OR f.b3 = ?",
+            tuple(bands),
+            story,
+        )
+        best = None
+        for oid, other, analysis in rows:
+            distance = (fp ^ (other & (1 << 64) - 1)).bit_count()
+            if distance <= DEDUP["max_distance"] and (
+                best is None or distance < best[0]
+            ):
+                best = (distance, oid, analysis)
+        return (best[1], json.loads(best[2]), "simhash") if best else None
+
+    def missing(self, entries: list) -> list:
+        """Archive ``entries`` (date, ranking) that have no listing in the store."""
+        with self._lock:
+            listed = set(
+                self._db().execute("SELECT DISTINCT date, ranking FROM listings")
+            )
+        return [e for e in entries if (e["date"], e["ranking"]) not in listed]
+
+    def dates(self, ranking: str) -> list:
+        with self._lock:
+            rows = (
+                self._db()
+                .execute(
+                    "SELECT DISTINCT date FROM listings WHERE ranking = ? ORDER BY date",
+                    (ranking,),
+                )
+                .fetchall()
+            )
+        return [date.fromisoformat(d) for (d,) in rows]
+
+    def load(self, day: date, ranking: str) -> list:
+        """One day's stories in page order, each with its stored analysis."""
+        with self._lock:
+            rows = (
+                self._db()
+                .execute(
+                    "SELECT s.hit, a.analysis FROM listings l"
+                    " JOIN stories s ON s.object_id = l.object_id"
+                    " LEFT JOIN analyses a ON a.object_id = l.object_id"
+                    " WHERE l.date = ? AND l.ranking = ? ORDER BY l.rank",
+                    (str(day), ranking),
+                )
+                .fetchall()
+            )
+        stories = []
+        for hit, analysis in rows:
+            story = json.loads(hit)
+            story["analysis"] = json.loads(analysis) if analysis else {}
+            stories.append(story)
+        return stories
+
+    def weekly_rollup(self, ranking: str) -> list:
+        """Per week (Monday first): distinct stories, points, topics, top story."""
+        with self._lock:
+            db = self._db()
+            totals = db.execute(
+                "SELECT strftime('%Y-W%W', l.date) AS week,"
+                " COUNT(DISTINCT l.object_id), SUM(s.points), MIN(l.date), MAX(l.date)"
+                " FROM listings l JOIN stories s ON s.object_id = l.object_id"
+                " WHERE l.ranking = ? GROUP BY week ORDER BY week",
+                (ranking,),
+            ).fetchall()
+            topics = db.execute(
+                "SELECT strftime('%Y-W%W', l.date) AS week,"
+                " COALESCE(a.topic_category, 'Others'), COUNT(DISTINCT l.object_id)"
+                " FROM listings l LEFT JOIN analyses a ON a.object_id = l.object_id"
+                " WHERE l.ranking = ? GROUP BY week, 2",
+                (ranking,),
+            ).fetchall()
+            tops = db.execute(
+                "SELECT week, title, points FROM ("
+                "  SELECT strftime('%Y-W%W', l.date) AS week, s.title, s.points,"
+                "  ROW_NUMBER() OVER (PARTITION BY strftime('%Y-W%W', l.date)"
+                "                     ORDER BY s.points DESC) AS n"
+                "  FROM listings l JOIN stories s ON s.object_id = l.object_id"
+                "  WHERE l.ranking = ?) WHERE n = 1",
+                (ranking,),
+            ).fetchall()
+        by_topic = defaultdict(dict)
+        for week, topic, n in topics:
+            by_topic[week][topic] = n
+        top = {week: (title, points) for week, title, points in tops}
+        return [
+            {
+                "week": week,
+                "from": first,
+                "to": last,
+                "stories": n,
+                "points": points or 0,
+                "topics": by_topic[week],
+                "top": top.get(week),
+            }
+            for week, n, points, first, last in totals
+        ]
+
+
+STORE = DigestStore(Path(CONFIG.get("store_path", "data/hn_digest.sqlite3")))
+
+# ── HTTP Transport ────────────────────────────────────────────────────────────
+
+DEFAULT_HTTP_TIMEOUT = 15
+HTTP_TIMEOUTS = {
+    "hacker-news.firebaseio.com": 10,
+    "hn.algolia.com": 20,
+    urlsplit(CONFIG.get("deepseek_api_base", "https://api.deepseek.com")).hostname: 120,
+    "generativelanguage.googleapis.com": 180,
+}
+# Upper bound on in-flight Firebase item requests across all stories.
+FIREBASE_CONCURRENCY = CONFIG.get("firebase_concurrency", 64)
+
+
+class Transport:
+    """One pooled, keep-alive ``requests.Session`` shared by the whole pipeline.
+
+    Each host gets its own connection pool of ``pool_size`` sockets, requests
+    get a per-host timeout unless the caller passes one, and idempotent
+    requests are retried with exponential backoff on 5xx and dropped
+    connections. 429s are left to the caller (see ``call_ai``). Connection
+    pools are instrumented so ``stats()`` can report how many connections
+    were opened versus reused per host.
+    """
+
+    def __init__(self, pool_size: int, retries: int = 3, backoff: float = 0.5):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {"requests": 0, "opened": 0})
+        self.timeouts = {**HTTP_TIMEOUTS, **CONFIG.get("http_timeouts", {})}
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            status_forcelist=(500, 502, 503, 504),
+            backoff_factor=backoff,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=32, pool_maxsize=pool_size, max_retries=retry
+        )
+        adapter.poolmanager.pool_classes_by_scheme = {
+            "http": self._counting(HTTPConnectionPool),
+            "https": self._counting(HTTPSConnectionPool),
+        }
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = "Mozilla/5.0 (compatible; HNDigest/1.0)"
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _counting(self, base):
+        transport = self
+
+        class CountingPool(base):
+            def _new_conn(self):
+                transport._count(self.host, "opened")
+                return super()._new_conn()
+
+            def _make_request(self, *args, **kwargs):
+                transport._count(self.host, "requests")
+                return super()._make_request(*args, **kwargs)
+
+        return CountingPool
+
+    def _count(self, host: str, field: str) -> None:
+        with self._lock:
+            self._stats[host][field] += 1
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        host = urlsplit(url).hostname
+        kwargs.setdefault("timeout", self.timeouts.get(host, DEFAULT_HTTP_TIMEOUT))
+        r = self.session.request(method, url, **kwargs)
+        retries = getattr(r.raw, "retries", None)
+        if retries is not None and retries.history:
+            METRICS.inc("http_retries", len(retries.history), host=host)
+        if not kwargs.get("stream"):
+            # Streamed bodies are counted by whoever reads them.
+            METRICS.inc("http_bytes", len(r.content), host=host)
+        return r
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def stats(self) -> dict:
+        """Per-host request, opened and reused connection counts."""
+        with self._lock:
+            return {
+                host: {**c, "reused": max(c["requests"] - c["opened"], 0)}
+                for host, c in self._stats.items()
+            }
+
+
+# Size the per-host pools to the widest fan-out hitting a single host.
+HTTP = Transport(
+    pool_size=max(
+        CONFIG.get("scrape_workers", 8),
+        FIREBASE_CONCURRENCY,
+        CONFIG.get("ai_workers", 1),
+    )
+)
 
 # ── HN APIs ───────────────────────────────────────────────────────────────────
 
@@ -53,111 +842,682 @@ RANKING_TAGS = {
 }
 
 
-def get_stories_for_date(target: date, n: int = 20, ranking: str = "top") -> list:
-    """Fetch top stories for a specific date using a more robust search."""
+# Algolia's /search ranks an empty query by points, so a window's first N hits
+# are its top N. Pages past that are never fetched; up to ``algolia_workers``
+# pages are in flight at once.
+ALGOLIA_PAGE_SIZE = CONFIG.get("algolia_page_size", 100)
+ALGOLIA_WORKERS = CONFIG.get("algolia_workers", 4)
+
+
+def _algolia_page(tag: str, target: date, page: int) -> dict:
     start_ts = int(
         datetime(target.year, target.month, target.day, tzinfo=timezone.utc).timestamp()
     )
-    end_ts = start_ts + 86400
-
     params = {
-        "tags": RANKING_TAGS.get(ranking, "front_page"),
-        "numericFilters": f"created_at_i>={start_ts},created_at_i<{end_ts}",
-        "hitsPerPage": 100,
+        "tags": tag,
+        "numericFilters": f"created_at_i>={start_ts},created_at_i<{start_ts + 86400}",
+        "hitsPerPage": ALGOLIA_PAGE_SIZE,
+        "page": page,
     }
+    with METRICS.timer("algolia"):
+        resp = HTTP.get(HN_ALGOLIA, params=params)
+    resp.raise_for_status()
+    return resp.json()
 
-    try:
-        resp = requests.get(f"{HN_ALGOLIA}", params=params, timeout=20)
-        resp.raise_for_status()
-        hits = resp.json().get("hits", [])
-    except Exception as e:
-        print(f"  ⚠ Algolia fetch failed: {e}")
-        return []
 
-    seen, deduped = set(), []
-    for h in hits:
-        oid = h.get("objectID")
-        if oid and oid not in seen:
-            seen.add(oid)
-            deduped.append(h)
+def fetch_story_lists(days: list, rankings: list, n: int = 20) -> dict:
+    """Top ``n`` stories for every (day, ranking) pair, fetched in one pass.
+
+    Page 0 of each date window tells how many pages it has; the further pages
+    needed for ``n`` stories are then requested concurrently for all windows
+    together. Rankings that read the same Algolia tag (best and top) share
+    their pages, and a story listed several times is one shared dict, so its
+    article, comments and analysis are only worked on once.
+    """
+    windows = sorted(
+        {(d, RANKING_TAGS.get(r, "front_page")) for d in days for r in rankings}
+    )
+    pages: dict[tuple, list] = {}
+    with ThreadPoolExecutor(
+        max_workers=ALGOLIA_WORKERS, thread_name_prefix="algolia"
+    ) as ex:
+        first = {w: ex.submit(_algolia_page, w[1], w[0], 0) for w in windows}
+        rest = {}
+        for (day, tag), fut in first.items():
+            try:
+                body = fut.result()
+            except Exception as e:
+                print(f"  ⚠ Algolia fetch failed for {day} ({tag}): {e}")
+                pages[day, tag] = []
+                continue
+            pages[day, tag] = [body]
+            wanted = min(body.get("nbPages", 1), -(-n // ALGOLIA_PAGE_SIZE))
+            rest[day, tag] = [
+                ex.submit(_algolia_page, tag, day, page) for page in range(1, wanted)
+            ]
+        for (day, tag), futs in rest.items():
+            for page, fut in enumerate(futs, 1):
+                try:
+                    pages[day, tag].append(fut.result())
+                except Exception as e:
+                    print(f"  ⚠ Algolia page {page} failed for {day} ({tag}): {e}")
+                    break
 
-    # Final sort by points to ensure top stories
-    deduped.sort(key=lambda h: h.get("points", 0), reverse=True)
-    return deduped[:n]
+    unique: dict[str, dict] = {}
+    lists = {}
+    for day in days:
+        for ranking in rankings:
+            tag = RANKING_TAGS.get(ranking, "front_page")
+            seen, deduped = set(), []
+            for body in pages[day, tag]:
+                for h in body.get("hits", []):
+                    oid = h.get("objectID")
+                    if oid and oid not in seen:
+                        seen.add(oid)
+                        deduped.append(unique.setdefault(oid, h))
+            # Final sort by points to ensure top stories
+            deduped.sort(key=lambda h: h.get("points", 0), reverse=True)
+            lists[day, ranking] = deduped[:n]
+    return lists
+
+
+def get_stories_for_date(target: date, n: int = 20, ranking: str = "top") -> list:
+    """Fetch top stories for a specific date (see fetch_story_lists)."""
+    return fetch_story_lists([target], [ranking], n)[target, ranking]
 
 
 def get_hn_item(item_id: int) -> dict:
+    """Firebase item, served from ITEM_STORE unless missing or stale."""
+    stored = ITEM_STORE.get(item_id)
+    if stored is not None:
+        return stored
+    return fetch_hn_item(item_id)
+
+
+def fetch_hn_item(item_id: int) -> dict:
     try:
-        r = requests.get(f"{HN_FIREBASE}/item/{item_id}.json", timeout=10)
-        return r.json() or {}
+        r = HTTP.get(f"{HN_FIREBASE}/item/{item_id}.json")
+        item = r.json() or {}
     except Exception:
         return {}
+    ITEM_STORE.put(item_id, item)
+    return item
+
+
+def _comment_entry(c: dict) -> dict | None:
+    if not c or c.get("dead") or c.get("deleted") or not c.get("text"):
+        return None
+    return {
+        "author": c.get("by", ""),
+        "score": c.get("score", 0),
+        "text": re.sub(r"<[^>]+>", " ", c.get("text", ""))[:600],
+        "replies": [],
+    }
+
+
+def _reply_entry(rep: dict) -> dict | None:
+    if not rep or rep.get("dead") or not rep.get("text"):
+        return None
+    return {
+        "author": rep.get("by", ""),
+        "text": re.sub(r"<[^>]+>", " ", rep.get("text", ""))[:300],
+    }
+
+
+class CommentFetcher:
+    """Fetches HN comment trees on one shared background event loop.
+
+    Every story's tree is walked breadth-first (story → top-level comments →
+    replies) as coroutines on the same loop. Each level is first looked up
+    in ITEM_STORE in one query; the remaining item requests pass through one
+    semaphore, so the number of in-flight Firebase requests is
+    bounded globally no matter how many comment workers call ``fetch()``.
+    The blocking HTTP calls run on a fixed thread pool owned by the loop
+    instead of pools created and torn down per story.
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self._loop = None
+        self._sem = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                loop.set_default_executor(
+                    ThreadPoolExecutor(self.concurrency, thread_name_prefix="firebase")
+                )
+                threading.Thread(
+                    target=loop.run_forever, name="comment-loop", daemon=True
+                ).start()
+                self._loop = loop
+            return self._loop
+
+    async def _items(self, ids: list) -> list:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+        stored = ITEM_STORE.get_many(ids)
+
+        async def one(item_id):
+            if item_id in stored:
+                return stored[item_id]
+            async with self._sem:
+                return await loop.run_in_executor(None, fetch_hn_item, item_id)
+
+        return await asyncio.gather(*(one(i) for i in ids))
+
+    async def _tree(self, item_id: int, max_top: int, max_replies: int) -> list:
+        (item,) = await self._items([item_id])
+        kids = (item.get("kids") or [])[:max_top]
+
+        entries, reply_ids = [], []
+        for c in await self._items(kids):
+            entry = _comment_entry(c)
+            if entry:
+                entries.append(entry)
+                reply_ids.append((c.get("kids") or [])[:max_replies])
+
+        flat = [rid for ids in reply_ids for rid in ids]
+        replies = iter(await self._items(flat))
+        for entry, ids in zip(entries, reply_ids):
+            for rep in (next(replies) for _ in ids):
+                reply = _reply_entry(rep)
+                if reply:
+                    entry["replies"].append(reply)
+        return entries
+
+    def fetch(self, item_id: int, max_top: int = 50, max_replies: int = 3) -> list:
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(
+            self._tree(item_id, max_top, max_replies), loop
+        ).result()
+
+
+COMMENT_FETCHER = CommentFetcher(FIREBASE_CONCURRENCY)
 
 
 def get_top_comments(item_id: int, max_top: int = 50, max_replies: int = 3) -> list:
-    """Return top-level comments + shallow replies using parallel fetching."""
-    item = get_hn_item(item_id)
-    kids = (item.get("kids") or [])[:max_top]
+    """Return top-level comments + shallow replies, fetched breadth-first."""
+    return COMMENT_FETCHER.fetch(item_id, max_top, max_replies)
 
-    def fetch_full_comment(kid_id):
-        c = get_hn_item(kid_id)
-        if not c or c.get("dead") or c.get("deleted") or not c.get("text"):
-            return None
 
-        entry = {
-            "author": c.get("by", ""),
-            "score": c.get("score", 0),
-            "text": re.sub(r"<[^>]+>", " ", c.get("text", ""))[:600],
-            "replies": [],
-        }
+MAX_ARTICLE_BYTES = CONFIG.get("max_article_bytes", 2_000_000)
+_NEWLINES_TO_SPACE = str.maketrans("\n\r\t", "   ")
+
+
+def _printable(text: str) -> str:
+    # Drop null bytes and other non-printables that break JSON/CLI; the
+    # isprintable() fast paths keep the per-character scan off normal text.
+    if text.isprintable():
+        return text
+    text = text.translate(_NEWLINES_TO_SPACE)
+    if text.isprintable():
+        return text
+    return "".join(ch for ch in text if ch.isprintable())
+
+
+class HTMLTextExtractor(HTMLParser):
+    """Incremental HTML → visible text with collapsed whitespace.
+
+    Tags, comments and declarations become a single space, ``<script>`` and
+    ``<style>`` bodies are dropped, and entities are kept verbatim. Once
+    ``max_chars`` of text have been produced ``done`` is set and further
+    input is ignored, so callers can stop reading the body.
+
+    On well-formed pages this gives the same text as the regex stripper it
+    replaced. Malformed markup differs: a bare ``<`` in text or a ``>``
+    inside an attribute value no longer swallows the text around it.
+    """
+
+    SKIP_TAGS = {"script", "style"}
+
+    def __init__(self, max_chars: int):
+        super().__init__(convert_charrefs=False)
+        self.max_chars = max_chars
+        self.parts: list[str] = []
+        self.size = 0
+        self.done = False
+        self._skipping = None
+        self._space = False
 
-        # Parallel fetch replies
-        r_ids = (c.get("kids") or [])[:max_replies]
-        if r_ids:
-            with ThreadPoolExecutor(max_workers=len(r_ids)) as ex:
-                replies = list(ex.map(get_hn_item, r_ids))
-                for rep in replies:
-                    if rep and not rep.get("dead") and rep.get("text"):
-                        entry["replies"].append(
-                            {
-                                "author": rep.get("by", ""),
-                                "text": re.sub(r"<[^>]+>", " ", rep.get("text", ""))[
-                                    :300
-                                ],
-                            }
-                        )
-        return entry
-
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        results = list(executor.map(fetch_full_comment, kids))
-
-    return [r for r in results if r]
+    def _emit(self, text: str) -> None:
+        if self.done:
+            return
+        text = _printable(text)
+        words = text.split()
+        if not words:
+            self._space = self._space or bool(text)
+            return
+        if self.size and (self._space or text[0] == " "):
+            self.parts.append(" ")
+            self.size += 1
+        chunk = " ".join(words)
+        self.parts.append(chunk)
+        self.size += len(chunk)
+        self._space = text[-1] == " "
+        self.done = self.size >= self.max_chars
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skipping = tag
+        self._space = True
+
+    def handle_endtag(self, tag):
+        if tag == self._skipping:
+            self._skipping = None
+        self._space = True
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self._emit(data)
+
+    def handle_entityref(self, name):
+        if not self._skipping:
+            self._emit(f"&{name};")
+
+    def handle_charref(self, name):
+        if not self._skipping:
+            self._emit(f"&#{name};")
+
+    def handle_comment(self, data):
+        self._space = True
+
+    def handle_decl(self, decl):
+        self._space = True
+
+    def handle_pi(self, data):
+        self._space = True
+
+    def unknown_decl(self, data):
+        self._space = True
+
+    def text(self) -> str:
+        return "".join(self.parts)[: self.max_chars]
+
+
+def html_to_text(html: str, max_chars: int = 20_000) -> str:
+    parser = HTMLTextExtractor(max_chars)
+    parser.feed(html)
+    if not parser.done:
+        parser.close()
+    return parser.text()
+
+
+def stream_html_to_text(
+    r: requests.Response, max_chars: int = 20_000, max_bytes: int = MAX_ARTICLE_BYTES
+) -> str:
+    """Extract text from a ``stream=True`` response chunk by chunk.
+
+    Reading stops as soon as ``max_chars`` of visible text exist or
+    ``max_bytes`` of body have been read, whichever comes first.
+    """
+    try:
+        decoder = codecs.getincrementaldecoder(r.encoding or "utf-8")("replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    parser = HTMLTextExtractor(max_chars)
+    read = 0
+    for chunk in r.iter_content(chunk_size=64 * 1024):
+        read += len(chunk)
+        parser.feed(decoder.decode(chunk))
+        if parser.done or read >= max_bytes:
+            break
+    else:
+        parser.feed(decoder.decode(b"", final=True))
+    METRICS.inc("http_bytes", read, host=urlsplit(r.url).hostname)
+    if not parser.done:
+        parser.close()
+    return parser.text()
+
+
+def is_text_content(content_type: str) -> bool:
+    ctype = content_type.split(";")[0].strip().lower()
+    return not ctype or ctype.startswith("text/") or "html" in ctype or "xml" in ctype
+
+
+def cache_lifetime(headers) -> float | None:
+    """Freshness lifetime in seconds from Cache-Control, or None if uncacheable.
+
+    ``no-store`` means don't keep the response at all; ``no-cache`` keeps it
+    but forces revalidation on every use (lifetime 0). ``private`` only bars
+    shared caches, and this one is local to a single user, so it is ignored.
+    """
+    cc = headers.get("Cache-Control", "").lower()
+    if "no-store" in cc:
+        return None
+    if "no-cache" in cc:
+        return 0.0
+    m = re.search(r"max-age=(\d+)", cc)
+    if not m:
+        return 0.0
+    try:
+        age = float(headers.get("Age", 0))
+    except ValueError:
+        age = 0.0
+    return max(int(m.group(1)) - age, 0.0)
 
 
 def fetch_article(url: str, max_chars: int = 20_000) -> str:
+    """Fetch an article as plain text through the local HTTP cache.
+
+    Fresh entries (within Cache-Control max-age) are served without touching
+    the network; stale ones are revalidated with If-None-Match /
+    If-Modified-Since and a 304 reuses the stored text. Only the extracted
+    text is kept, never the raw HTML. The body is streamed and parsed
+    incrementally, and the download stops once ``max_chars`` of text are
+    extracted or MAX_ARTICLE_BYTES have been read. Non-text content types
+    are rejected before reading the body.
+    """
     if not url:
         return "[No article URL - likely an Ask/Show HN post]"
     if url.lower().endswith(".pdf"):
         return "[Article is a PDF - scraping not supported for binary files]"
+
+    key = content_key("article", url, max_chars)
+    entry = ARTICLE_CACHE.get(key)
+    if entry and entry.get("expires", 0) > time.time():
+        return entry["text"]
+
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
     try:
-        headers = {"User-Agent": "Mozilla/5.0 (compatible; HNDigest/1.0)"}
-        r = requests.get(url, headers=headers, timeout=15, allow_redirects=True)
-        r.raise_for_status()
-        # Strip null bytes and non-printable characters that break JSON/CLI
-        text = "".join(ch for ch in r.text if ch.isprintable() or ch in "\n\r\t")
-        text = re.sub(r"<script[^>]*>.*?</script>", " ", text, flags=re.DOTALL | re.I)
-        text = re.sub(r"<style[^>]*>.*?</style>", " ", text, flags=re.DOTALL | re.I)
-        text = re.sub(r"<[^>]+>", " ", text)
-        text = re.sub(r"\s+", " ", text).strip()
-        return text[:max_chars]
+        with HTTP.get(url, headers=headers, allow_redirects=True, stream=True) as r:
+            if r.status_code == 304 and entry:
+                lifetime = cache_lifetime(r.headers)
+                entry["expires"] = time.time() + (lifetime or 0)
+                ARTICLE_CACHE.put(key, entry)
+                return entry["text"]
+            r.raise_for_status()
+            ctype = r.headers.get("Content-Type", "")
+            if not is_text_content(ctype):
+                return f"[Article is {ctype.split(';')[0]} - scraping not supported for binary files]"
+            text = stream_html_to_text(r, max_chars)
     except Exception as e:
+        if entry:
+            return entry["text"]
         return f"[Article fetch failed: {e}]"
 
+    lifetime = cache_lifetime(r.headers)
+    etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+    if lifetime is not None and (lifetime > 0 or etag or last_modified):
+        ARTICLE_CACHE.put(
+            key,
+            {
+                "url": url,
+                "etag": etag,
+                "last_modified": last_modified,
+                "expires": time.time() + lifetime,
+                "text": text,
+            },
+        )
+    return text
+
+
+# ── Rate Limiting ─────────────────────────────────────────────────────────────
+
+AI_MAX_RETRIES = 4
+AI_BACKOFF_BASE = 2.0
+AI_BACKOFF_CAP = 60.0
+
+DEFAULT_RATE_LIMITS = {
+    "deepseek": {"rpm": 60, "tpm": 1_000_000},
+    "gemini": {"rpm": 15, "tpm": 1_000_000},
+}
+
+
+class RateLimitError(RuntimeError):
+    """Raised by a provider call that was rejected for exceeding its quota."""
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 chars per token) used for TPM accounting."""
+    return len(text) // 4 + 1
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RateLimiter:
+    """Thread-safe token bucket enforcing requests- and tokens-per-minute.
+
+    The request bucket holds ``burst`` tokens (default 1), so calls are spread
+    evenly at the RPM ceiling instead of bursting. The token bucket holds one
+    minute of TPM quota. ``penalize()`` blocks every caller until a provider
+    supplied deadline (Retry-After) has passed.
+    """
+
+    def __init__(self, rpm: float, tpm: float | None = None, burst: int = 1):
+        self.rpm, self.tpm, self.burst = rpm, tpm, burst
+        self._lock = threading.Lock()
+        self._requests = float(burst)
+        self._tokens = float(tpm or 0)
+        self._stamp = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._stamp
+        self._stamp = now
+        self._requests = min(self.burst, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Block until one request of ``tokens`` fits the quota; return the wait."""
+        if self.tpm:
+            tokens = min(tokens, self.tpm)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._blocked_until - now
+                if self._requests < 1:
+                    wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+                if self.tpm and self._tokens < tokens:
+                    wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+                if wait <= 0:
+                    self._requests -= 1
+                    if self.tpm:
+                        self._tokens -= tokens
+                    return waited
+            time.sleep(wait)
+            waited += wait
+
+    def penalize(self, seconds: float) -> None:
+        """Hold back all callers for ``seconds`` (e.g. after a 429)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+_RATE_LIMITERS: dict[str, RateLimiter] = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> RateLimiter:
+    """Shared limiter for ``provider``, configured from config.json ``rate_limits``."""
+    with _RATE_LIMITERS_LOCK:
+        if provider not in _RATE_LIMITERS:
+            conf = {
+                **DEFAULT_RATE_LIMITS.get(provider, {"rpm": 15}),
+                **CONFIG.get("rate_limits", {}).get(provider, {}),
+            }
+            _RATE_LIMITERS[provider] = RateLimiter(
+                rpm=conf["rpm"], tpm=conf.get("tpm"), burst=conf.get("burst", 1)
+            )
+        return _RATE_LIMITERS[provider]
+
+
+def backoff_delay(attempt: int, retry_after: float | None = None) -> float:
+    """Retry-After if the provider sent one, else capped exponential backoff.
+
+    Both get random jitter so parallel workers don't retry in lockstep.
+    """
+    if retry_after is not None:
+        return retry_after + random.uniform(0, 1.0)
+    return random.uniform(0, min(AI_BACKOFF_CAP, AI_BACKOFF_BASE * 2**attempt))
+
 
 # ── AI API Calls ──────────────────────────────────────────────────────────────
 
+STREAM_RESPONSES = CONFIG.get("stream_responses", False)
+STREAM_MAX_CHARS = CONFIG.get("stream_max_chars", 60_000)
+STREAM_RETRIES = 1
 
-def call_deepseek(prompt: str) -> str:
+# Top-level keys a single-story or batch analysis may open with.
+RESPONSE_KEYS = {
+    "topic_category",
+    "summary_paragraphs",
+    "highlight",
+    "concise_sentiment",
+    "key_points",
+    "sentiments",
+    "analyses",
+    "objectID",
+}
+
+# Whitespace and (a possibly partial) ```json fence may precede the object.
+_STREAM_PREAMBLE = re.compile(r"\s*(`{1,3}[A-Za-z]*\s*)?")
+
+
+class StreamAbort(RuntimeError):
+    """A streamed response was cancelled because it can't become valid JSON."""
+
+
+class JsonStreamValidator:
+    """Incremental scanner that spots where a streamed JSON object ends.
+
+    It only tracks string/escape state and brace depth, which is enough to
+    know when the top-level object has closed (so the rest of the stream can
+    be dropped) or that the response has gone wrong: prose instead of ``{``,
+    an unexpected first key, or a runaway past ``max_chars``.
+    """
+
+    def __init__(self, keys: set = RESPONSE_KEYS, max_chars: int = STREAM_MAX_CHARS):
+        self.keys = keys
+        self.max_chars = max_chars
+        self.parts: list = []
+        self.size = 0
+        self.depth = 0
+        self.started = self.done = False
+        self.in_string = self.escaped = False
+        self.first_key = None
+        self._in_key = False
+        self._preamble = ""
+
+    def feed(self, chunk: str) -> bool:
+        """Consume ``chunk``; True once the top-level object has closed."""
+        for i, ch in enumerate(chunk):
+            if not self.started:
+                if ch == "{":
+                    self.started, self.depth = True, 1
+                    continue
+                self._preamble += ch
+                if not _STREAM_PREAMBLE.fullmatch(self._preamble):
+                    raise StreamAbort(
+                        "response does not start with a JSON object: "
+                        f"{self._preamble[:40]!r}"
+                    )
+                continue
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self._in_key:
+                        self._in_key = False
+                        if self.first_key not in self.keys:
+                            raise StreamAbort(f"unexpected key {self.first_key!r}")
+                if self._in_key:
+                    self.first_key += ch
+            elif ch == '"':
+                self.in_string = True
+                if self.first_key is None:
+                    self.first_key, self._in_key = "", True
+            elif ch in "{[":
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.parts.append(chunk[: i + 1])
+                    self.size += i + 1
+                    self.done = True
+                    return True
+        self.parts.append(chunk)
+        self.size += len(chunk)
+        if self.size > self.max_chars:
+            raise StreamAbort(f"response exceeded {self.max_chars} chars")
+        return False
+
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+def iter_sse(r):
+    """Decoded JSON payloads of a server-sent events response."""
+    r.encoding = "utf-8"
+    host = urlsplit(r.url).hostname
+    for line in r.iter_lines(decode_unicode=True):
+        METRICS.inc("http_bytes", len(line.encode()) + 1, host=host)
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        yield json.loads(data)
+
+
+def read_stream(
+    r, provider: str, started: float, extract, cancel: threading.Event | None = None
+) -> str:
+    """Feed an SSE completion through a JsonStreamValidator.
+
+    ``extract(event)`` returns ``(thinking, content)`` deltas; the first of
+    either marks time-to-first-token. Returns as soon as the object closes,
+    leaving the caller to drop the connection and the tokens still queued.
+    Raises HedgeCancelled as soon as ``cancel`` is set.
+    """
+    validator = JsonStreamValidator()
+    first = True
+    for event in iter_sse(r):
+        if cancel is not None and cancel.is_set():
+            raise HedgeCancelled(f"{provider} stream no longer needed")
+        thinking, content = extract(event)
+        if first and (thinking or content):
+            ROUTER.record_ttft(provider, time.monotonic() - started)
+            first = False
+        if content and validator.feed(content):
+            return validator.text().strip()
+    if not validator.started:
+        raise StreamAbort("stream ended without a JSON object")
+    return validator.text().strip()
+
+
+def call_deepseek(prompt: str, cancel: threading.Event | None = None) -> str:
     """Invoke DeepSeek API directly."""
     api_key = os.environ.get("DEEPSEEK_API_KEY")
     if not api_key:
@@ -175,11 +1535,24 @@ def call_deepseek(prompt: str) -> str:
             {"role": "user", "content": prompt},
         ],
         "response_format": {"type": "json_object"},
+        "stream": STREAM_RESPONSES,
     }
 
-    r = requests.post(url, headers=headers, json=payload, timeout=120)
-    r.raise_for_status()
-    return r.json()["choices"][0]["message"]["content"]
+    def delta(event):
+        d = (event.get("choices") or [{}])[0].get("delta", {})
+        return d.get("reasoning_content"), d.get("content")
+
+    started = time.monotonic()
+    with HTTP.post(url, headers=headers, json=payload, stream=STREAM_RESPONSES) as r:
+        if r.status_code == 429:
+            raise RateLimitError(
+                "DeepSeek rate limit exceeded",
+                retry_after=parse_retry_after(r.headers.get("Retry-After")),
+            )
+        r.raise_for_status()
+        if STREAM_RESPONSES:
+            return read_stream(r, "deepseek", started, delta, cancel)
+        return r.json()["choices"][0]["message"]["content"]
 
 
 def call_gemini_cli(prompt: str) -> str:
@@ -208,17 +1581,382 @@ def call_gemini_cli(prompt: str) -> str:
             return proc.stdout.strip()
 
     stderr = proc.stderr.strip()[:400]
+    if re.search(r"\b429\b|RESOURCE_EXHAUSTED|quota exceeded", proc.stderr, re.I):
+        m = re.search(r"retry(?:Delay)?\D{0,10}?(\d+(?:\.\d+)?)s", proc.stderr, re.I)
+        raise RateLimitError(
+            f"Gemini rate limit exceeded: {stderr}",
+            retry_after=float(m.group(1)) if m else None,
+        )
     raise RuntimeError(f"Gemini CLI error: {stderr}")
 
 
-def call_ai(prompt: str) -> str:
-    if CONFIG["primary_provider"] == "deepseek":
-        return call_deepseek(prompt)
+GEMINI_API_BASE = CONFIG.get(
+    "gemini_api_base", "https://generativelanguage.googleapis.com/v1beta"
+)
+
+
+def call_gemini_api(prompt: str, cancel: threading.Event | None = None) -> str:
+    """Invoke the Gemini generateContent endpoint over the shared session.
+
+    Returns the same stripped response text as call_gemini_cli, without
+    paying the CLI's process startup per story.
+    """
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        raise RuntimeError("GEMINI_API_KEY env var not set")
+
+    method = "streamGenerateContent?alt=sse" if STREAM_RESPONSES else "generateContent"
+    url = f"{GEMINI_API_BASE}/models/{CONFIG['gemini_model']}:{method}"
+    payload = {
+        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+        "generationConfig": {"responseMimeType": "application/json"},
+    }
+
+    def text_of(body):
+        candidates = body.get("candidates") or []
+        if not candidates:
+            return ""
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(p.get("text", "") for p in parts)
+
+    started = time.monotonic()
+    with HTTP.post(
+        url, headers={"x-goog-api-key": api_key}, json=payload, stream=STREAM_RESPONSES
+    ) as r:
+        if r.status_code == 429:
+            m = re.search(r'"retryDelay":\s*"(\d+(?:\.\d+)?)s"', r.text)
+            raise RateLimitError(
+                "Gemini rate limit exceeded",
+                retry_after=parse_retry_after(r.headers.get("Retry-After"))
+                or (float(m.group(1)) if m else None),
+            )
+        if not r.ok:
+            raise RuntimeError(
+                f"Gemini API error {r.status_code}: {r.text.strip()[:400]}"
+            )
+        if STREAM_RESPONSES:
+            return read_stream(
+                r, "gemini", started, lambda e: (None, text_of(e)), cancel
+            )
+        text = text_of(r.json())
+    if not text:
+        raise RuntimeError("Gemini API returned no candidates")
+    return text.strip()
+
+
+def call_gemini(prompt: str, cancel: threading.Event | None = None) -> str:
+    """Gemini via the HTTP API when a key is available, else via the CLI.
+
+    ``gemini_backend`` in config.json ("api" or "cli") forces one or the other.
+    """
+    backend = CONFIG.get("gemini_backend") or (
+        "api" if os.environ.get("GEMINI_API_KEY") else "cli"
+    )
+    if backend == "api":
+        return call_gemini_api(prompt, cancel)
     return call_gemini_cli(prompt)
 
 
+def call_provider(
+    provider: str, prompt: str, cancel: threading.Event | None = None
+) -> str:
+    """Call one provider under its shared RPM/TPM limiter.
+
+    429s are retried after the provider's Retry-After (or a jittered
+    exponential backoff), and the wait is applied to every worker sharing
+    the limiter so they don't keep hammering an exhausted quota. A streamed
+    response cancelled by the JSON validator is retried immediately. Once
+    ``cancel`` is set (a hedged rival won), HedgeCancelled is raised.
+    """
+    backend = call_deepseek if provider == "deepseek" else call_gemini
+    limiter = get_rate_limiter(provider)
+    tokens = estimate_tokens(prompt)
+
+    attempt = aborts = 0
+    while True:
+        limiter.acquire(tokens)
+        if cancel is not None and cancel.is_set():
+            raise HedgeCancelled(f"{provider} call no longer needed")
+        try:
+            response = backend(prompt, cancel)
+            METRICS.observe("prompt_tokens", tokens, provider=provider)
+            METRICS.observe("response_chars", len(response), provider=provider)
+            return response
+        except StreamAbort as e:
+            # Cancelled early, so the retry is cheap: go again straight away.
+            ROUTER.record_abort(provider)
+            METRICS.inc("llm_retries", provider=provider, reason="stream_abort")
+            if aborts == STREAM_RETRIES:
+                raise
+            aborts += 1
+            print(f"         ✂️  {provider} stream cancelled ({e}), retrying")
+        except RateLimitError as e:
+            if attempt == AI_MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt, e.retry_after)
+            METRICS.inc("llm_retries", provider=provider, reason="rate_limit")
+            print(f"         ⏳ {provider} rate limited, retrying in {delay:.1f}s")
+            limiter.penalize(delay)
+            attempt += 1
+
+
+# ── Provider Routing ──────────────────────────────────────────────────────────
+
+
+class ProviderHealth:
+    """Rolling latency / error window and circuit breaker for one provider."""
+
+    def __init__(self, window: int, breaker_failures: int, breaker_cooldown: float):
+        self.latencies: deque = deque(maxlen=window)
+        self.outcomes: deque = deque(maxlen=window)
+        self.ttfts: deque = deque(maxlen=window)
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.calls = self.errors = self.hedges = self.aborts = 0
+
+    def record(self, latency: float, ok: bool) -> None:
+        self.calls += 1
+        self.probing = False
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+            self.consecutive_failures = 0
+            self.opened_at = None
+        else:
+            self.errors += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.breaker_failures:
+                self.opened_at = time.monotonic()
+
+    def p95(self) -> float | None:
+        return percentile(self.latencies, 0.95)
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def available(self) -> bool:
+        """Closed breaker, or open long enough to let a half-open trial through."""
+        if self.opened_at is None:
+            return True
+        return time.monotonic() - self.opened_at >= self.breaker_cooldown
+
+    def admit(self) -> bool:
+        """May a call go out now? Half-open admits a single probe at a time."""
+        if self.opened_at is None:
+            return True
+        if self.probing or not self.available():
+            return False
+        self.probing = True
+        return True
+
+
+class HedgeCancelled(RuntimeError):
+    """A provider call was stopped because a hedged rival already answered."""
+
+
+def provider_configured(provider: str) -> bool:
+    if provider == "deepseek":
+        return bool(os.environ.get("DEEPSEEK_API_KEY"))
+    return bool(os.environ.get("GEMINI_API_KEY") or shutil.which("gemini"))
+
+
+class ProviderRouter:
+    """Routes call_ai over DeepSeek and Gemini by weight, health and latency.
+
+    The primary is drawn by ``weights`` among providers whose breaker is
+    closed. If it hasn't answered within its rolling p95 latency (once
+    ``hedge_min_samples`` calls are known) a hedged request goes to the next
+    provider and the first success wins. A provider that fails or trips
+    its breaker after ``breaker_failures`` consecutive errors is skipped
+    in favour of the next one until ``breaker_cooldown_s`` has passed.
+    """
+
+    def __init__(self, conf: dict):
+        primary = CONFIG["primary_provider"]
+        self.weights = conf.get("weights") or {
+            p: 1.0 if p == primary else 0.0 for p in ("deepseek", "gemini")
+        }
+        self.hedge = conf.get("hedge", True)
+        self.hedge_min_samples = conf.get("hedge_min_samples", 5)
+        self.health = {
+            p: ProviderHealth(
+                conf.get("window", 50),
+                conf.get("breaker_failures", 3),
+                conf.get("breaker_cooldown_s", 120),
+            )
+            for p in self.weights
+        }
+        # Credentials and the gemini binary don't change during a run.
+        self.configured = {p: provider_configured(p) for p in self.weights}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(
+            max_workers=2 * CONFIG.get("ai_workers", 1), thread_name_prefix="llm"
+        )
+
+    def providers(self) -> list:
+        """Every provider that can answer, highest weight first."""
+        configured = [p for p in self.weights if self.configured[p]]
+        return sorted(configured, key=lambda p: -self.weights[p]) or [
+            CONFIG["primary_provider"]
+        ]
+
+    def last_provider(self) -> str:
+        """Provider whose answer this thread's last call() returned."""
+        return getattr(self._local, "provider", None) or CONFIG["primary_provider"]
+
+    def order(self) -> list:
+        """Providers to try, primary first: weighted pick, then by weight."""
+        with self._lock:
+            candidates = [
+                p
+                for p in self.weights
+                if self.configured[p] and self.health[p].available()
+            ] or [p for p in self.weights if self.configured[p]]
+        if not candidates:
+            return [CONFIG["primary_provider"]]
+        weighted = [p for p in candidates if self.weights[p] > 0]
+        first = (
+            random.choices(weighted, [self.weights[p] for p in weighted])[0]
+            if weighted
+            else candidates[0]
+        )
+        rest = sorted(
+            (p for p in candidates if p != first), key=lambda p: -self.weights[p]
+        )
+        return [first, *rest]
+
+    def _timed(self, provider: str, prompt: str, cancel: threading.Event) -> str:
+        t0 = time.monotonic()
+        try:
+            result = call_provider(provider, prompt, cancel)
+        except HedgeCancelled:
+            # Not the provider's fault: no error, no breaker strike.
+            with self._lock:
+                self.health[provider].probing = False
+                self.health[provider].aborts += 1
+            METRICS.inc("llm_hedges_cancelled", provider=provider)
+            raise
+        except Exception:
+            with self._lock:
+                self.health[provider].record(time.monotonic() - t0, ok=False)
+            METRICS.inc("llm_errors", provider=provider)
+            raise
+        elapsed = time.monotonic() - t0
+        with self._lock:
+            self.health[provider].record(elapsed, ok=True)
+        METRICS.observe("llm_call_seconds", elapsed, provider=provider)
+        return result
+
+    def record_ttft(self, provider: str, seconds: float) -> None:
+        with self._lock:
+            self.health[provider].ttfts.append(seconds)
+        METRICS.observe("llm_ttft_seconds", seconds, provider=provider)
+
+    def record_abort(self, provider: str) -> None:
+        with self._lock:
+            self.health[provider].aborts += 1
+
+    def _hedge_after(self, provider: str) -> float | None:
+        health = self.health[provider]
+        if not self.hedge or len(health.latencies) < self.hedge_min_samples:
+            return None
+        return health.p95()
+
+    def call(self, prompt: str) -> str:
+        queue = self.order()
+        running: dict = {}
+        errors = []
+        # Set once an answer wins, so a hedged rival still running stops early.
+        cancel = threading.Event()
+
+        def launch(hedge: bool = False) -> None:
+            while queue:
+                provider = queue.pop(0)
+                with self._lock:
+                    if not self.health[provider].admit():
+                        errors.append(f"{provider}: circuit open")
+                        continue
+                    if hedge:
+                        self.health[provider].hedges += 1
+                fut = self._pool.submit(self._timed, provider, prompt, cancel)
+                running[fut] = provider
+                return
+
+        launch()
+        while running:
+            hedge_after = self._hedge_after(next(iter(running.values())))
+            timeout = hedge_after if queue and len(running) == 1 else None
+            finished, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not finished:
+                # Primary is slower than its p95: race it against the next one.
+                launch(hedge=True)
+                continue
+            for fut in finished:
+                provider = running.pop(fut)
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    errors.append(f"{provider}: {e}")
+                    continue
+                cancel.set()
+                self._local.provider = provider
+                return result
+            if not running and queue:
+                launch()
+        raise RuntimeError("All providers failed - " + "; ".join(errors))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                p: {
+                    "calls": h.calls,
+                    "errors": h.errors,
+                    "hedges": h.hedges,
+                    "stream_aborts": h.aborts,
+                    "error_rate": round(h.error_rate(), 3),
+                    "p95_s": round(h.p95(), 2) if h.p95() is not None else None,
+                    "ttft_p50_s": (
+                        round(percentile(h.ttfts, 0.5), 2) if h.ttfts else None
+                    ),
+                    "breaker_open": h.opened_at is not None,
+                }
+                for p, h in self.health.items()
+            }
+
+
+ROUTER = ProviderRouter(CONFIG.get("routing", {}))
+
+
+def call_ai(prompt: str) -> str:
+    return ROUTER.call(prompt)
+
+
+def with_provenance(analysis: dict) -> dict:
+    """Tag ``analysis`` with the provider and model that answered the last call."""
+    provider = ROUTER.last_provider()
+    return {**analysis, "provider": provider, "model": active_model(provider)}
+
+
 # ── Analysis Schema & Prompt ───────────────────────────────────────────────────
 
+# Bump whenever the prompt template or schema changes so cached analyses
+# produced by the old prompt are no longer served.
+PROMPT_VERSION = 2
+
+# Token budget per prompt section (estimate_tokens units). Trimming keeps the
+# article's lead and the highest-scored comments, so prompt size, latency and
+# cost stay roughly flat however long the article or thread is.
+PROMPT_BUDGETS = {
+    "article": 3000,
+    "comments": 2500,
+    "schema": 400,
+    **CONFIG.get("prompt_budgets", {}),
+}
+
 ANALYSIS_SCHEMA = """{
   "topic_category": "AI Fundamentals|AI Applications|Tech|Politics|Others",
   "summary_paragraphs": [
@@ -239,21 +1977,78 @@ ANALYSIS_SCHEMA = """{
 }"""
 
 
-def analyze_story(story: dict, article: str, comments: list) -> dict:
-    """Ask AI to produce a structured JSON analysis."""
+def trim_to_tokens(text: str, budget: int) -> str:
+    """Keep the lead of ``text`` within ``budget`` tokens, cut at a clean break."""
+    if estimate_tokens(text) <= budget:
+        return text
+    cut = text[: budget * 4]
+    for sep in ("\n\n", ". ", "\n", " "):
+        end = cut.rfind(sep)
+        if end > len(cut) // 2:
+            cut = cut[: end + len(sep.rstrip())]
+            break
+    return cut.rstrip() + " […]"
 
-    comments_block = (
-        "\n\n".join(
-            f"[{c['author']} score={c.get('score', 0)}]: {c['text']}"
-            + "".join(
-                f"\n  ↳ [{r['author']}]: {r['text']}" for r in c.get("replies", [])
-            )
-            for c in comments[:25]
-        )
+
+def format_comment(c: dict, replies: bool = True) -> str:
+    return f"[{c['author']} score={c.get('score', 0)}]: {c['text']}" + (
+        "".join(f"\n  ↳ [{r['author']}]: {r['text']}" for r in c.get("replies", []))
+        if replies
+        else ""
+    )
+
+
+def format_comments(comments: list, budget: int | None = None) -> str:
+    """Comments block within ``budget`` tokens (default: the comments budget).
+
+    Threads are admitted highest score first, ties keeping HN's own ranking,
+    with their replies if they still fit and without them otherwise. The
+    chosen threads are then laid out in their original order.
+    """
+    budget = PROMPT_BUDGETS["comments"] if budget is None else budget
+    ranked = sorted(
+        range(len(comments)), key=lambda i: -(comments[i].get("score") or 0)
+    )
+    chosen, used = {}, 0
+    for i in ranked:
+        for text in (format_comment(comments[i]), format_comment(comments[i], False)):
+            cost = estimate_tokens(text)
+            if used + cost <= budget:
+                chosen[i] = text
+                used += cost
+                break
+    return (
+        "\n\n".join(chosen[i] for i in sorted(chosen))
         or "[No comments available - reason from article topic and HN norms]"
     )
 
-    prompt = textwrap.dedent(f"""
+
+def prompt_schema() -> str:
+    """ANALYSIS_SCHEMA, or a whitespace-collapsed copy if over its budget."""
+    if estimate_tokens(ANALYSIS_SCHEMA) <= PROMPT_BUDGETS["schema"]:
+        return ANALYSIS_SCHEMA
+    return re.sub(r"\s+", " ", ANALYSIS_SCHEMA)
+
+
+# objectID -> {"article", "comments", "schema", "total", "trimmed"} token counts
+# for every prompt sent this run, for the per-story log line and run stats.
+PROMPT_REPORT: dict = {}
+
+
+def record_prompt(
+    story: dict, article: str, comments_block: str, total: int, trimmed: bool
+) -> None:
+    PROMPT_REPORT[str(story.get("objectID", ""))] = {
+        "article": estimate_tokens(article),
+        "comments": estimate_tokens(comments_block),
+        "schema": estimate_tokens(prompt_schema()),
+        "total": total,
+        "trimmed": trimmed,
+    }
+
+
+def build_prompt(story: dict, article: str, comments_block: str) -> str:
+    return textwrap.dedent(f"""
         You are writing a high-quality daily tech digest for a sophisticated engineering audience.
         Analyse the Hacker News story below and return ONLY valid JSON - no markdown fences, no preamble.
 
@@ -263,7 +2058,7 @@ def analyze_story(story: dict, article: str, comments: list) -> dict:
         Points   : {story.get('points', 0)}
         Comments : {story.get('num_comments', 0)}
 
-        ── ARTICLE TEXT (up to 20 000 chars) ────────────────────────────
+        ── ARTICLE TEXT (lead) ───────────────────────────────────────────
         {article}
 
         ── HN COMMENTS (top threads + shallow replies) ───────────────────
@@ -283,11 +2078,49 @@ def analyze_story(story: dict, article: str, comments: list) -> dict:
         • Return ONLY the JSON object - nothing else.
 
         JSON schema:
-        {ANALYSIS_SCHEMA}
+        {prompt_schema()}
     """).strip()
 
-    raw = call_ai(prompt)
 
+SENTIMENT_SCHEMA = '{\n  "sentiments": ' + ANALYSIS_SCHEMA.split('"sentiments": ', 1)[1]
+# Summary context given to a sentiment refresh, in tokens.
+SENTIMENT_SUMMARY_BUDGET = 400
+
+
+def build_sentiment_prompt(story: dict, summary: str, comments_block: str) -> str:
+    """Smaller prompt for a near-duplicate: the summary exists, comments are new."""
+    return textwrap.dedent(f"""
+        You are updating a daily tech digest for a sophisticated engineering audience.
+        The article behind this Hacker News story was already summarised (below); only
+        the discussion is new. Return ONLY valid JSON - no markdown fences, no preamble.
+
+        ── STORY ─────────────────────────────────────────────────────────
+        Title    : {story.get("title", "")}
+        URL      : {story.get("url", "")}
+        Points   : {story.get("points", 0)}
+        Comments : {story.get("num_comments", 0)}
+
+        ── EXISTING SUMMARY ──────────────────────────────────────────────
+        {summary}
+
+        ── HN COMMENTS (top threads + shallow replies) ───────────────────
+        {comments_block}
+
+        ── INSTRUCTIONS ─────────────────────────────────────────────────
+        • sentiments: identify EXACTLY 4 distinct, deep opinion clusters from the REAL comments.
+          For each cluster, provide approximately 100 words of analysis, citing specific phrasing
+          or unique arguments visible in the comments.
+          estimated_agreement = rough number of commenters for this cluster,
+          inferred from upvote scores and reply counts in the comments block.
+          If comments are sparse, say so and reason from known HN community patterns.
+        • Return ONLY the JSON object - nothing else.
+
+        JSON schema:
+        {SENTIMENT_SCHEMA}
+    """).strip()
+
+
+def parse_analysis(raw: str) -> dict:
     # Strip any accidental markdown fencing
     raw = re.sub(r"^```(?:json)?\s*", "", raw.strip(), flags=re.I)
     raw = re.sub(r"\s*```$", "", raw.strip())
@@ -302,6 +2135,223 @@ def analyze_story(story: dict, article: str, comments: list) -> dict:
         raise ValueError(f"Could not parse JSON from AI response:\n{raw[:300]}")
 
 
+def analysis_cache_key(
+    story: dict, article: str, comments_block: str, provider: str
+) -> str:
+    """Content address of an analysis: same inputs, same model, same prompt."""
+    return content_key(
+        provider,
+        active_model(provider),
+        PROMPT_VERSION,
+        story.get("title", ""),
+        story.get("url", ""),
+        article,
+        comments_block,
+    )
+
+
+def analysis_cache_keys(story: dict, article: str, comments_block: str) -> list:
+    """Cache keys for an analysis from each provider the router may use."""
+    return [
+        analysis_cache_key(story, article, comments_block, p)
+        for p in ROUTER.providers()
+    ]
+
+
+def analyze_story(story: dict, article: str, comments: list) -> dict:
+    """Ask AI to produce a structured JSON analysis (cached by content)."""
+    lead = trim_to_tokens(article, PROMPT_BUDGETS["article"])
+    comments_block = format_comments(comments)
+    cached = ANALYSIS_CACHE.get(*analysis_cache_keys(story, lead, comments_block))
+    if cached is not None:
+        return cached
+
+    prompt = build_prompt(story, lead, comments_block)
+    record_prompt(story, lead, comments_block, estimate_tokens(prompt), lead != article)
+    # Only validated analyses are cached; a ValueError leaves the caller to fall back.
+    analysis = with_provenance(validate_analysis(parse_analysis(call_ai(prompt))))
+    key = analysis_cache_key(story, lead, comments_block, analysis["provider"])
+    ANALYSIS_CACHE.put(key, analysis)
+    return analysis
+
+
+def refresh_sentiments(
+    story: dict, comments: list, source: str, previous: dict
+) -> dict:
+    """``previous`` analysis of story ``source`` with sentiments from ``comments``."""
+    comments_block = format_comments(comments)
+    summary = trim_to_tokens(
+        "\n\n".join(previous.get("summary_paragraphs", [])), SENTIMENT_SUMMARY_BUDGET
+    )
+
+    def key(provider):
+        return content_key(
+            "sentiments",
+            provider,
+            active_model(provider),
+            PROMPT_VERSION,
+            story.get("title", ""),
+            summary,
+            comments_block,
+        )
+
+    refreshed = ANALYSIS_CACHE.get(*map(key, ROUTER.providers()))
+    if refreshed is None:
+        prompt = build_sentiment_prompt(story, summary, comments_block)
+        record_prompt(story, "", comments_block, estimate_tokens(prompt), False)
+        sentiments = parse_analysis(call_ai(prompt)).get("sentiments")
+        if not isinstance(sentiments, list) or not all(
+            isinstance(x, dict) for x in sentiments
+        ):
+            raise ValueError("sentiments must be a list of objects")
+        refreshed = {"sentiments": sentiments}
+        ANALYSIS_CACHE.put(key(ROUTER.last_provider()), refreshed)
+    return {
+        **previous,
+        "sentiments": refreshed["sentiments"],
+        "reused_from": previous.get("reused_from", source),
+    }
+
+
+TOPIC_CATEGORIES = ("AI Fundamentals", "AI Applications", "Tech", "Politics", "Others")
+
+
+def validate_analysis(obj) -> dict:
+    """Check one analysis object against ANALYSIS_SCHEMA; raise ValueError if unusable."""
+    if not isinstance(obj, dict):
+        raise ValueError(f"analysis is {type(obj).__name__}, not an object")
+    paras = obj.get("summary_paragraphs")
+    if (
+        not isinstance(paras, list)
+        or not paras
+        or not all(isinstance(p, str) for p in paras)
+    ):
+        raise ValueError("summary_paragraphs must be a non-empty list of strings")
+    if not isinstance(obj.get("key_points", []), list):
+        raise ValueError("key_points must be a list")
+    sentiments = obj.get("sentiments", [])
+    if not isinstance(sentiments, list) or not all(
+        isinstance(x, dict) for x in sentiments
+    ):
+        raise ValueError("sentiments must be a list of objects")
+    if obj.get("topic_category") not in TOPIC_CATEGORIES:
+        obj["topic_category"] = "Others"
+    return obj
+
+
+def build_batch_prompt(entries: list) -> str:
+    """One prompt for several (story, article, comments_block) entries, schema once."""
+    blocks = "\n\n".join(
+        f"── STORY objectID={story.get('objectID', '')} ──────────────────────────\n"
+        f"Title    : {story.get('title', '')}\n"
+        f"URL      : {story.get('url', '')}\n"
+        f"Points   : {story.get('points', 0)}\n"
+        f"Comments : {story.get('num_comments', 0)}\n"
+        f"Article  : {article}\n"
+        f"HN comments:\n{comments_block}"
+        for story, article, comments_block in entries
+    )
+    schema = prompt_schema().replace(
+        "{", '{\n  "objectID": "<objectID from the story header>",', 1
+    )
+    return (
+        "You are writing a high-quality daily tech digest for a sophisticated "
+        "engineering audience.\n"
+        f"Analyse EACH of the {len(entries)} Hacker News stories below independently "
+        "and return ONLY valid JSON - no markdown fences, no preamble - of the form "
+        '{"analyses": [ ... ]} with exactly one element per story.\n\n'
+        f"{blocks}\n\n"
+        "── INSTRUCTIONS ─────────────────────────────────────────────────\n"
+        "• objectID: copy it exactly from the story header.\n"
+        "• summary_paragraphs: exactly two paragraphs, totaling approximately 300 words.\n"
+        "• highlight: a single memorable stat, pull-quote, or key insight.\n"
+        "• sentiments: identify EXACTLY 4 distinct opinion clusters from that story's "
+        "REAL comments, ~100 words each; estimated_agreement = rough number of "
+        "commenters. If comments are sparse, say so and reason from HN norms.\n"
+        "• topic_category must be exactly one of the five enum values.\n"
+        "• Never mix content between stories.\n\n"
+        f"JSON schema for each element of analyses:\n{schema}"
+    )
+
+
+def parse_batch(raw: str) -> list:
+    raw = re.sub(r"^```(?:json)?\s*", "", raw.strip(), flags=re.I)
+    raw = re.sub(r"\s*```$", "", raw.strip())
+    data = json.loads(raw)
+    if isinstance(data, dict):
+        data = data.get("analyses", data.get("stories"))
+    if not isinstance(data, list):
+        raise ValueError("batch response is not a list of analyses")
+    return data
+
+
+def analyze_batch(items: list) -> dict:
+    """Analyse several (story, article, comments) in one LLM request.
+
+    Returns ``{objectID: analysis}`` for every story that was cached or came
+    back as a valid element. Stories missing from the result, because the
+    batch was malformed or their element failed validation, are left for
+    the caller to analyse one by one with analyze_story().
+    """
+    done, pending = {}, []
+    for story, article, comments in items:
+        lead = trim_to_tokens(article, PROMPT_BUDGETS["article"])
+        comments_block = format_comments(comments)
+        cached = ANALYSIS_CACHE.get(*analysis_cache_keys(story, lead, comments_block))
+        if cached is not None:
+            done[str(story.get("objectID"))] = cached
+        else:
+            pending.append((story, lead, comments_block, lead != article))
+    if not pending:
+        return done
+    if len(pending) == 1:
+        story, lead, comments_block, trimmed = pending[0]
+        prompt = build_prompt(story, lead, comments_block)
+        record_prompt(story, lead, comments_block, estimate_tokens(prompt), trimmed)
+        try:
+            analysis = validate_analysis(parse_analysis(call_ai(prompt)))
+        except ValueError as e:
+            print(f"         ⚠ Analysis of {story.get('objectID')} invalid ({e})")
+            return done
+        analysis = with_provenance(analysis)
+        key = analysis_cache_key(story, lead, comments_block, analysis["provider"])
+        ANALYSIS_CACHE.put(key, analysis)
+        return {**done, str(story.get("objectID")): analysis}
+
+    prompt = build_batch_prompt([p[:3] for p in pending])
+    # Each story is charged an equal share of the batch prompt.
+    share = estimate_tokens(prompt) // len(pending)
+    for story, lead, comments_block, trimmed in pending:
+        record_prompt(story, lead, comments_block, share, trimmed)
+    raw = call_ai(prompt)
+    provider = ROUTER.last_provider()
+    try:
+        elements = parse_batch(raw)
+    except ValueError as e:
+        print(f"         ⚠ Malformed batch response ({e}); falling back per story")
+        return done
+
+    keys = {
+        str(story.get("objectID")): analysis_cache_key(story, lead, block, provider)
+        for story, lead, block, _ in pending
+    }
+    for element in elements:
+        oid = str(element.get("objectID", "")) if isinstance(element, dict) else ""
+        if oid not in keys or oid in done:
+            continue
+        try:
+            analysis = validate_analysis(
+                {k: v for k, v in element.items() if k != "objectID"}
+            )
+        except ValueError as e:
+            print(f"         ⚠ Batch element {oid} invalid ({e})")
+            continue
+        analysis = {**analysis, "provider": provider, "model": active_model(provider)}
+        ANALYSIS_CACHE.put(keys[oid], analysis)
+        done[oid] = analysis
+    return done
+
+
 # ── Styling & Constants ────────────────────────────────────────────────────────
 
 SENT_CLASS = {
@@ -386,11 +2436,11 @@ a:hover{opacity:.75}
 .sentiment-table td{padding:12px;vertical-align:top;color:#c8c0b0;font-weight:300;line-height:1.55}
 .sentiment-table td:first-child{width:20%;font-family:'DM Mono',monospace;font-size:12px;padding-top:14px;color:var(--text);font-weight:500}
 .sentiment-table td:last-child{width:12%;text-align:right;padding-top:14px;white-space:nowrap}
-.sent-positive{border-left:2px solid var(--green)}
-.sent-negative{border-left:2px solid var(--red)}
-.sent-neutral{border-left:2px solid var(--text-muted)}
-.sent-mixed{border-left:2px solid var(--amber)}
-.sent-debate{border-left:2px solid var(--purple)}
+.sent-positive{--sent:var(--green);border-left:2px solid var(--sent)}
+.sent-negative{--sent:var(--red);border-left:2px solid var(--sent)}
+.sent-neutral{--sent:var(--text-muted);border-left:2px solid var(--sent)}
+.sent-mixed{--sent:var(--amber);border-left:2px solid var(--sent)}
+.sent-debate{--sent:var(--purple);border-left:2px solid var(--sent)}
 .vote-count{font-family:'DM Mono',monospace;font-size:12px;color:var(--amber-light);font-weight:500}
 .others-table-wrap{overflow-x:auto}
 .others-table{width:100%;border-collapse:collapse;font-size:13px}
@@ -403,16 +2453,212 @@ a:hover{opacity:.75}
 .rank-num{font-family:'DM Mono',monospace;font-size:11px;color:var(--text-muted)}
 .pts-mono{font-family:'DM Mono',monospace;font-size:11px;color:var(--amber-light);white-space:nowrap}
 .cmts-mono{font-family:'DM Mono',monospace;font-size:11px;color:var(--text-dim);white-space:nowrap}
+.others-body{padding:18px 26px}
+.others-intro{font-size:14px;color:var(--text-dim);margin-bottom:18px}
+.others-stats{width:120px}
+.others-stats .rank-num{margin-bottom:4px}
+.others-stats .pts-mono{margin-bottom:2px}
+.others-title{margin-bottom:8px}
+.others-title a{font-family:"Playfair Display",serif;font-size:1.1rem;font-weight:700;color:var(--text)}
+.others-summary{font-size:14px;line-height:1.5;color:#c0b8a8}
+.sent-badge{margin-top:8px;padding:6px 10px;background:rgba(255,255,255,0.03);border-radius:2px}
+.sent-badge-label{font-family:'DM Mono',monospace;font-size:10px;color:var(--sent);text-transform:uppercase;font-weight:600}
+.sent-badge-desc{font-size:11px;color:var(--text-dim);margin-left:6px}
+.sent-badge-agree{font-family:'DM Mono',monospace;font-size:10px;color:var(--amber);margin-left:8px}
 .footer{border-top:1px solid var(--border);margin-top:64px;padding:28px 0;text-align:center}
 .footer p{font-family:'DM Mono',monospace;font-size:11px;letter-spacing:.1em;color:var(--text-muted)}
+.footer p.footer-note{margin-top:6px;font-size:10px}
+.latest{margin-top:48px;text-align:center}
+.toc{display:flex;align-items:center;gap:8px}
+.nav-home{font-family:'DM Mono',monospace;font-size:11px;padding:5px 14px;background:var(--amber);color:var(--bg);border-radius:3px;margin-right:12px;font-weight:800;letter-spacing:0.05em}
+.nav-cat{font-family:'DM Mono',monospace;font-size:10px;padding:4px 10px;border-radius:3px;border:1px solid var(--border);color:var(--text-dim)}
+.nav-cat.ai-fund{border-color:rgba(196,92,58,0.3);color:#e87a5a}
+.nav-cat.ai-app{border-color:rgba(90,158,111,0.3);color:#7ec890}
+.nav-cat.tech{border-color:rgba(74,181,168,0.3);color:var(--teal)}
+.nav-cat.pol{border-color:rgba(74,138,181,0.3);color:#7ab8e0}
+.nav-cat.nav-archive{border-color:rgba(212,160,23,0.3);color:var(--amber-light);margin-right:12px}
+.cal{display:grid;grid-template-columns:repeat(7,1fr);gap:6px;margin:24px 0 48px}
+.cal-dow{font-family:'DM Mono',monospace;font-size:10px;letter-spacing:.12em;text-transform:uppercase;color:var(--text-muted);text-align:center;padding:4px 0}
+.cal-day{min-height:72px;background:var(--bg2);border:1px solid var(--border);border-radius:3px;padding:6px 8px;display:flex;flex-direction:column;gap:2px;min-width:0}
+.cal-day.cal-empty{background:none;border:none}
+.cal-day.has-report{border-color:rgba(212,160,23,.4)}
+.cal-num{font-family:'DM Mono',monospace;font-size:11px;color:var(--text-dim)}
+.cal-day a{font-family:'DM Mono',monospace;font-size:10px;color:var(--amber-light);text-transform:uppercase;overflow:hidden;text-overflow:ellipsis;white-space:nowrap}
+.search-box input{width:100%;background:var(--bg2);border:1px solid var(--border);border-radius:3px;color:var(--text);font-family:'Source Serif 4',Georgia,serif;font-size:1.1rem;padding:12px 16px;outline:none}
+.search-box input:focus{border-color:var(--amber)}
+.search-status{font-family:'DM Mono',monospace;font-size:11px;color:var(--text-muted);margin:10px 0 18px;min-height:16px}
+.search-results{list-style:none;margin-bottom:48px}
+.search-results li{display:flex;justify-content:space-between;align-items:baseline;gap:16px;border-bottom:1px solid var(--border);padding:12px 4px}
+.search-results a{font-family:'Playfair Display',serif;font-size:1.1rem;font-weight:700}
+.search-meta{font-family:'DM Mono',monospace;font-size:11px;color:var(--text-dim);white-space:nowrap}
+.archive-months{list-style:none;margin:24px 0 48px}
+.archive-months li{display:flex;justify-content:space-between;align-items:baseline;border-bottom:1px solid var(--border);padding:12px 4px}
+.archive-months a{font-family:'Playfair Display',serif;font-size:1.2rem;font-weight:700}
+.archive-months span{font-family:'DM Mono',monospace;font-size:11px;color:var(--text-dim)}
 .latest-label{font-family:'DM Mono',monospace; font-size:12px; color:var(--amber); text-transform:uppercase; letter-spacing:0.2em; margin-bottom:16px;}
-@media(max-width:640px){.nav-inner{gap:8px}}"""
+@media(max-width:640px){.nav-inner{gap:8px}.cal-day{min-height:48px;padding:4px}}"""
+
+
+# ── Static Assets ─────────────────────────────────────────────────────────────
+
+# Pages link one minified stylesheet whose name carries a hash of its content,
+# so browsers and CDNs may cache it forever: a CSS change produces a new URL.
+FONTS_CSS_URL = (
+    "https://fonts.googleapis.com/css2?family=Playfair+Display:ital,wght@0,700;"
+    "0,900;1,700&family=Source+Serif+4:ital,wght@0,300;0,400;0,600"
+    "&family=DM+Mono:wght@400;500&display=swap"
+)
+# Google only serves woff2 to browsers it recognises.
+FONTS_USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
+SELF_HOST_FONTS = CONFIG.get("self_host_fonts", False)
+FONT_SUBSETS = CONFIG.get("font_subsets", ["latin"])
+# Netlify / Cloudflare Pages read this file; GitHub Pages ignores it.
+HEADERS_FILE = """/assets/*
+  Cache-Control: public, max-age=31536000, immutable
+"""
+
+_STYLESHEET: str | None = None
+_FONT_FACES: str | None = None
+# Asset files by path under OUTPUT_DIR; rendering only registers them here and
+# write_assets() puts them on disk, so building a page has no side effects.
+_ASSETS: dict[str, bytes] = {}
+
+
+def minify_css(css: str) -> str:
+    """Drop comments and the whitespace CSS does not need."""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r" ?([{}:;,>]) ?", r"\1", css)
+    css = re.sub(r"(?<![\w.-])0\.(\d)", r".\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def _write_asset(path: Path, data: bytes) -> None:
+    if path.exists():
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def write_assets(root: Path = OUTPUT_DIR) -> None:
+    """Write the registered assets that are not on disk yet, plus ``_headers``."""
+    for name, data in list(_ASSETS.items()):
+        _write_asset(root / name, data)
+    (root / "_headers").write_text(HEADERS_FILE, encoding="utf-8")
+
+
+def self_hosted_font_faces() -> str:
+    """``@font-face`` rules pointing at local copies of the Google fonts.
+
+    Only the ``FONT_SUBSETS`` blocks are kept. The downloads are cached under
+    ``.cache/fonts`` so a run only hits Google once. Returns "" on any failure,
+    in which case pages fall back to the Google stylesheet.
+    """
+    global _FONT_FACES
+    if _FONT_FACES is not None:
+        return _FONT_FACES
+    cache = CACHE_DIR / "fonts"
+    cache.mkdir(parents=True, exist_ok=True)
+    faces = []
+    try:
+        css_path = cache / "fonts.css"
+        if not css_path.exists():
+            r = HTTP.get(FONTS_CSS_URL, headers={"User-Agent": FONTS_USER_AGENT})
+            r.raise_for_status()
+            css_path.write_text(r.text, encoding="utf-8")
+        blocks = re.findall(
+            r"/\*\s*([\w-]+)\s*\*/\s*(@font-face\s*\{.*?\})",
+            css_path.read_text(encoding="utf-8"),
+            flags=re.S,
+        )
+        for subset, block in blocks:
+            if subset not in FONT_SUBSETS:
+                continue
+            url = re.search(r"url\((https://[^)]+\.woff2)\)", block)
+            if not url:
+                continue
+            name = hashlib.sha256(url.group(1).encode()).hexdigest()[:16] + ".woff2"
+            font_path = cache / name
+            if not font_path.exists():
+                r = HTTP.get(url.group(1))
+                r.raise_for_status()
+                font_path.write_bytes(r.content)
+            _ASSETS[f"assets/fonts/{name}"] = font_path.read_bytes()
+            faces.append(block.replace(url.group(0), f"url(fonts/{name})"))
+    except (requests.RequestException, OSError) as e:
+        print(f"  ⚠ Self-hosted fonts unavailable, using Google Fonts: {e}")
+        faces = []
+    _FONT_FACES = "\n".join(faces)
+    return _FONT_FACES
+
+
+def font_links() -> str:
+    """``<head>`` tags for the web fonts, or nothing when they are self-hosted."""
+    if SELF_HOST_FONTS and self_hosted_font_faces():
+        return ""
+    # Loaded as print media and switched on load, so text renders right away
+    # in a fallback font instead of waiting for fonts.googleapis.com.
+    return (
+        '<link rel="preconnect" href="https://fonts.googleapis.com">\n'
+        '<link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>\n'
+        f'<link rel="stylesheet" href="{escape(FONTS_CSS_URL)}" media="print" '
+        "onload=\"this.media='all'\">\n"
+        f'<noscript><link rel="stylesheet" href="{escape(FONTS_CSS_URL)}"></noscript>\n'
+    )
+
+
+def stylesheet_href() -> str:
+    """URL of ``assets/digest.<hash>.css``; write_assets() writes the file."""
+    global _STYLESHEET
+    if _STYLESHEET is None:
+        faces = self_hosted_font_faces() if SELF_HOST_FONTS else ""
+        css = minify_css(faces + "\n" + PAGE_CSS).encode("utf-8")
+        _STYLESHEET = f"assets/digest.{hashlib.sha256(css).hexdigest()[:12]}.css"
+        _ASSETS[_STYLESHEET] = css
+    return _STYLESHEET
 
 
 # ── HTML Builders ─────────────────────────────────────────────────────────────
 
+# Each template is an f-string function, compiled once by Python at import.
+# Builders append rendered chunks to one list; build_index joins that list a
+# single time together with the page layout, instead of re-copying a
+# growing string row by row.
 
-def story_card_html(rank: int, story: dict) -> str:
+
+def _sentiment_class(s: dict) -> str:
+    return SENT_CLASS.get(s.get("type", "neutral"), "sent-neutral")
+
+
+def _sentiment_row(s: dict) -> str:
+    return (
+        f'<tr class="{_sentiment_class(s)}">'
+        f"<td>{escape(s.get('label', ''))}</td>"
+        f"<td>{escape(s.get('description', ''))}</td>"
+        f'<td><span class="vote-count">'
+        f"{escape(str(s.get('estimated_agreement', '')))}"
+        "</span></td></tr>"
+    )
+
+
+def _sentiment_badge(s: dict) -> str:
+    return (
+        f'<div class="sent-badge {_sentiment_class(s)}">'
+        f'<span class="sent-badge-label">{escape(s.get("label", ""))}</span> '
+        f'<span class="sent-badge-desc">{escape(s.get("description", ""))}</span> '
+        f'<span class="sent-badge-agree">'
+        f"({escape(str(s.get('estimated_agreement', '')))})</span>"
+        "</div>"
+    )
+
+
+def write_story_card(out: list, rank: int, story: dict) -> None:
+    """Append one full story card to ``out``."""
     a = story.get("analysis", {})
     title = escape(story.get("title", "Untitled"))
     url = escape(story.get("url", "#") or "#")
@@ -420,33 +2666,20 @@ def story_card_html(rank: int, story: dict) -> str:
     ncmts = story.get("num_comments", 0)
     hn_id = story.get("objectID", "")
 
-    para_html = "".join(f"<p>{escape(p)}</p>" for p in a.get("summary_paragraphs", []))
-
+    summary = [f"<p>{escape(p)}</p>" for p in a.get("summary_paragraphs", [])]
     hl = a.get("highlight", "")
-    hl_html = f'<div class="highlight-box"><p>{escape(hl)}</p></div>' if hl else ""
-
+    if hl:
+        summary.append(f'<div class="highlight-box"><p>{escape(hl)}</p></div>')
     kps = a.get("key_points", [])
-    kp_html = ""
     if kps:
-        items = "".join(f"<li>{escape(k)}</li>" for k in kps)
-        kp_html = (
+        items = "".join([f"<li>{escape(k)}</li>" for k in kps])
+        summary.append(
             f'<div class="key-points">'
             f'<div class="key-points-title">Key Highlights</div>'
             f"<ul>{items}</ul></div>"
         )
 
-    rows = ""
-    for s in a.get("sentiments", []):
-        rc = SENT_CLASS.get(s.get("type", "neutral"), "sent-neutral")
-        rows += (
-            f'<tr class="{rc}">'
-            f'<td>{escape(s.get("label", ""))}</td>'
-            f'<td>{escape(s.get("description", ""))}</td>'
-            f'<td><span class="vote-count">'
-            f'{escape(str(s.get("estimated_agreement", "")))}'
-            '</span></td></tr>'
-        )
-
+    rows = "".join([_sentiment_row(s) for s in a.get("sentiments", [])])
     sent_html = ""
     if rows:
         sent_html = (
@@ -457,7 +2690,7 @@ def story_card_html(rank: int, story: dict) -> str:
             f"<tbody>{rows}</tbody></table></div>"
         )
 
-    return f"""
+    out.append(f"""
 <div class="story-card">
   <div class="story-header">
     <div class="story-num">#{rank}</div>
@@ -469,14 +2702,32 @@ def story_card_html(rank: int, story: dict) -> str:
     </div>
   </div>
   <div class="story-body">
-    <div class="story-summary">{para_html}{hl_html}{kp_html}</div>
+    <div class="story-summary">{"".join(summary)}</div>
     {sent_html}
   </div>
+</div>""")
+
+
+OTHERS_HEAD = """
+<div class="story-card">
+  <div class="story-body others-body">
+    <p class="others-intro">
+      Remaining stories - comprehensive digest table.
+    </p>
+    <div class="others-table-wrap">
+      <table class="others-table">
+        <thead><tr><th>Stats</th><th>Digest</th></tr></thead>
+        <tbody>"""
+OTHERS_TAIL = """</tbody>
+      </table>
+    </div>
+  </div>
 </div>"""
 
 
-def others_table_html(stories: list) -> str:
-    rows = ""
+def write_others_table(out: list, stories: list) -> None:
+    """Append the compact table of (rank, story) pairs to ``out``."""
+    out.append(OTHERS_HEAD)
     for rank, story in stories:
         a = story.get("analysis", {})
         title = escape(story.get("title", ""))
@@ -488,102 +2739,78 @@ def others_table_html(stories: list) -> str:
         # Build full summary (~200 words)
         para = " ".join(a.get("summary_paragraphs", []))
         summary_text = escape(para[:1200] + "..." if len(para) > 1200 else para)
+        sent_html = "".join([_sentiment_badge(s) for s in a.get("sentiments", [])])
 
-        # Build inline sentiment badges
-        sent_html = ""
-        for s in a.get("sentiments", []):
-            stype = s.get("type", "neutral")
-            slabel = escape(s.get("label", ""))
-            sdesc = escape(s.get("description", ""))
-            agree = escape(str(s.get("estimated_agreement", "")))
-            color = "#5a5446"
-            if stype == "positive":
-                color = "#5a9e6f"
-            elif stype == "negative":
-                color = "#c45c3a"
-            elif stype == "mixed":
-                color = "#d4a017"
-            elif stype == "debate":
-                color = "#8a6bbf"
-
-            sent_html += (
-                f'<div style="margin-top:8px; padding:6px 10px; background:rgba(255,255,255,0.03); border-left:2px solid {color}; border-radius:2px;">'
-                f"<span style=\"font-family:'DM Mono',monospace; font-size:10px; color:{color}; text-transform:uppercase; font-weight:600;\">{slabel}</span> "
-                f'<span style="font-size:11px; color:var(--text-dim); margin-left:6px;">{sdesc}</span> '
-                f"<span style=\"font-family:'DM Mono',monospace; font-size:10px; color:var(--amber); margin-left:8px;\">({agree})</span>"
-                f"</div>"
-            )
-
-        rows += (
+        out.append(
             f"<tr>"
-            f"<td style='width:120px;'>"
-            f"<div class='rank-num' style='margin-bottom:4px'>#{rank}</div>"
-            f"<div class='pts-mono' style='margin-bottom:2px'>{pts} pts</div>"
+            f"<td class='others-stats'>"
+            f"<div class='rank-num'>#{rank}</div>"
+            f"<div class='pts-mono'>{pts} pts</div>"
             f"<div class='cmts-mono'><a href='https://news.ycombinator.com/item?id={hn_id}' target='_blank'>{ncmts} c</a></div>"
             f"</td>"
             f"<td>"
-            f"<div style='margin-bottom:8px;'><a href='{url}' target='_blank' style='font-family:\"Playfair Display\",serif; font-size:1.1rem; font-weight:700; color:var(--text);'>{title}</a></div>"
-            f"<div style='font-size:14px; line-height:1.5; color:#c0b8a8;'>{summary_text}</div>"
+            f"<div class='others-title'><a href='{url}' target='_blank'>{title}</a></div>"
+            f"<div class='others-summary'>{summary_text}</div>"
             f"{sent_html}"
             f"</td>"
             f"</tr>"
         )
-    return f"""
-<div class="story-card">
-  <div class="story-body" style="padding:18px 26px">
-    <p style="font-size:14px;color:var(--text-dim);margin-bottom:18px">
-      Remaining stories - comprehensive digest table.
-    </p>
-    <div class="others-table-wrap">
-      <table class="others-table">
-        <thead><tr><th>Stats</th><th>Digest</th></tr></thead>
-        <tbody>{rows}</tbody>
-      </table>
-    </div>
-  </div>
-</div>"""
+    out.append(OTHERS_TAIL)
+
+
+def story_card_html(rank: int, story: dict) -> str:
+    out = []
+    write_story_card(out, rank, story)
+    return out[0]
+
+
+def others_table_html(stories: list) -> str:
+    out = []
+    write_others_table(out, stories)
+    return "".join(out)
 
 
 # ── UI Helpers ────────────────────────────────────────────────────────────────
 
 
-def get_navbar_html() -> str:
-    """Generate a consistent navigation bar without history."""
-    return """
+NAVBAR_TEMPLATE = """
 <div class="nav-controls">
   <div class="nav-inner">
-    <div class="toc" style="display:flex; align-items:center; gap:8px;">
-      <a href="./index.html" style="font-family:'DM Mono',monospace; font-size:11px; padding:5px 14px; background:var(--amber); color:var(--bg); border-radius:3px; margin-right:12px; font-weight:800; letter-spacing:0.05em;">HOME</a>
-      <a href="#ai-fund" class="ai-fund" style="font-family:'DM Mono',monospace; font-size:10px; padding:4px 10px; border-radius:3px; border:1px solid rgba(196,92,58,0.3); color:#e87a5a;">AI Fundamentals</a>
-      <a href="#ai-app"  class="ai-app"  style="font-family:'DM Mono',monospace; font-size:10px; padding:4px 10px; border-radius:3px; border:1px solid rgba(90,158,111,0.3); color:#7ec890;">AI Applications</a>
-      <a href="#tech"    class="tech"    style="font-family:'DM Mono',monospace; font-size:10px; padding:4px 10px; border-radius:3px; border:1px solid rgba(74,181,168,0.3); color:var(--teal);">Tech</a>
-      <a href="#politics" class="pol"     style="font-family:'DM Mono',monospace; font-size:10px; padding:4px 10px; border-radius:3px; border:1px solid rgba(74,138,181,0.3); color:#7ab8e0;">Politics</a>
-      <a href="#others"  class="others"  style="font-family:'DM Mono',monospace; font-size:10px; padding:4px 10px; border-radius:3px; border:1px solid var(--border); color:var(--text-dim);">Others</a>
+    <div class="toc">
+      <a href="./index.html" class="nav-home">HOME</a>
+      <a href="./archive.html" class="nav-cat nav-archive">Archive</a>
+      <a href="./search.html" class="nav-cat nav-archive">Search</a>{}
     </div>
   </div>
 </div>"""
+NAVBAR_SECTIONS = """
+      <a href="#ai-fund"  class="nav-cat ai-fund">AI Fundamentals</a>
+      <a href="#ai-app"   class="nav-cat ai-app">AI Applications</a>
+      <a href="#tech"     class="nav-cat tech">Tech</a>
+      <a href="#politics" class="nav-cat pol">Politics</a>
+      <a href="#others"   class="nav-cat others">Others</a>"""
+NAVBAR_HTML = NAVBAR_TEMPLATE.format(NAVBAR_SECTIONS)
+ARCHIVE_NAVBAR_HTML = NAVBAR_TEMPLATE.format("")
+
 
+def get_navbar_html(sections: bool = True) -> str:
+    """Navigation bar; archive pages have no topic sections to jump to."""
+    return NAVBAR_HTML if sections else ARCHIVE_NAVBAR_HTML
 
-def wrap_with_layout(
-    title: str, date_str: str, subtitle: str, content: str, navbar_html: str
-) -> str:
-    """Master layout wrapper for all pages."""
-    model_str = (
-        CONFIG["deepseek_model"]
-        if CONFIG["primary_provider"] == "deepseek"
-        else CONFIG["gemini_model"]
-    )
-    provider_str = CONFIG["primary_provider"].capitalize()
 
-    return f"""<!DOCTYPE html>
+def layout_parts(
+    title: str, date_str: str, subtitle: str, navbar_html: str
+) -> tuple[str, str]:
+    """Page layout before and after the content, so callers can join once."""
+    model_str = active_model()
+    provider_str = CONFIG["primary_provider"].capitalize()
+    head = f"""<!DOCTYPE html>
 <html lang="en">
 <head>
 <meta charset="UTF-8">
 <meta name="viewport" content="width=device-width,initial-scale=1.0">
 <title>{title}</title>
-<link rel="preconnect" href="https://fonts.googleapis.com">
-<link href="https://fonts.googleapis.com/css2?family=Playfair+Display:ital,wght@0,700;0,900;1,700&family=Source+Serif+4:ital,wght@0,300;0,400;0,600&family=DM+Mono:wght@400;500&display=swap" rel="stylesheet">
-<style>{PAGE_CSS}</style>
+{font_links()}<link rel="stylesheet" href="{stylesheet_href()}">
 </head>
 <body>
 <div class="masthead">
@@ -593,11 +2820,12 @@ def wrap_with_layout(
   <div class="masthead-rule"></div>
 </div>
 {navbar_html}
-<div class="container">{content}</div>
+<div class="container">"""
+    tail = f"""</div>
 <div class="footer">
   <div class="container">
     <p>Data: HN Algolia Search + Firebase APIs - Summaries: {model_str} via {provider_str}</p>
-    <p style="margin-top:6px;font-size:10px">
+    <p class="footer-note">
       Sentiment analysis uses real HN comment threads fetched at generation time.
       Agreement estimates are inferred from comment upvote distribution and reply volume.
     </p>
@@ -605,15 +2833,108 @@ def wrap_with_layout(
 </div>
 </body>
 </html>"""
+    return head, tail
+
+
+def wrap_with_layout(
+    title: str, date_str: str, subtitle: str, content: str, navbar_html: str
+) -> str:
+    """Master layout wrapper for all pages."""
+    head, tail = layout_parts(title, date_str, subtitle, navbar_html)
+    return head + content + tail
 
 
 # ── Manifest & Retention ──────────────────────────────────────────────────────
 
-# Manifest logic removed as per user request to remove data persistency.
+
+class Archive:
+    """Dated reports, indexed by a manifest sharded by month.
+
+    ``manifest/YYYY-MM.json`` lists one month's reports. ``manifest.json``
+    holds only the months with their report counts and the latest report.
+    Adding a day rewrites one shard and the small index, never the whole
+    history. Each file is replaced atomically, shards before the index, so
+    the index never points at a missing report.
+    """
+
+    def __init__(self, root: Path = OUTPUT_DIR):
+        self.index_path = root / "manifest.json"
+        self.shard_dir = root / "manifest"
+        self.migrated: set[str] = set()
+
+    @staticmethod
+    def _read(path: Path) -> dict:
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write(path: Path, value: dict) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps(value, indent=2, ensure_ascii=False), encoding="utf-8"
+        )
+        os.replace(tmp, path)
+
+    def index(self) -> dict:
+        index = self._read(self.index_path)
+        if "entries" in index:
+            # Flat manifest from before sharding: split it once.
+            flat = index.pop("entries")
+            index.pop("files", None)
+            index["months"] = self._merge(index.get("months", {}), flat)
+            index["latest"] = max(flat, key=lambda e: e["date"], default=None)
+            self.migrated |= {e["date"][:7] for e in flat}
+        index.setdefault("months", {})
+        return index
+
+    def month(self, key: str) -> list:
+        return self._read(self.shard_dir / f"{key}.json").get("entries", [])
+
+    def _merge(self, months: dict, entries: list) -> dict:
+        by_month = defaultdict(list)
+        for e in entries:
+            by_month[e["date"][:7]].append(e)
+        for key, new in by_month.items():
+            merged = {(e["date"], e["ranking"]): e for e in self.month(key)}
+            merged.update({(e["date"], e["ranking"]): e for e in new})
+            shard = [merged[k] for k in sorted(merged)]
+            self._write(
+                self.shard_dir / f"{key}.json", {"month": key, "entries": shard}
+            )
+            months[key] = {"file": f"manifest/{key}.json", "count": len(shard)}
+        return dict(sorted(months.items()))
+
+    def entries(self) -> list:
+        """Every archived report, oldest month first."""
+        return [e for key in self.index()["months"] for e in self.month(key)]
+
+    def add(self, entries: list) -> set[str]:
+        """Record reports; returns the months whose shard changed."""
+        index = self.index()
+        index["months"] = self._merge(index["months"], entries)
+        newest = max(entries, key=lambda e: e["date"])
+        if newest["date"] >= (index.get("latest") or {}).get("date", ""):
+            index["latest"] = newest
+        self._write(self.index_path, index)
+        changed = {e["date"][:7] for e in entries} | self.migrated
+        self.migrated = set()
+        return changed
+
+
+ARCHIVE = Archive()
 
 # ── Page Templates ─────────────────────────────────────────────────────────────
 
 
+SECTION_HEADER = (
+    '<div class="section-header" id="{}"><span class="section-badge {}">{}</span>'
+    '<div class="section-line"></div></div>\n'
+).format
+
+
 def build_index(stories: list, target: date, ranking: str) -> str:
     cats: dict[str, list] = {
         "AI Fundamentals": [],
@@ -628,95 +2949,1332 @@ def build_index(stories: list, target: date, ranking: str) -> str:
             cat = "Others"
         cats[cat].append((i + 1, s))
 
-    sections = ""
+    out = ['<div class="latest"><div class="latest-label">Latest Briefing</div></div>']
     for cat, items in cats.items():
         if not items:
             continue
-        sid, bid = SECTION_ID[cat], BADGE_CLASS[cat]
-        sections += f'<div class="section-header" id="{sid}"><span class="section-badge {bid}">{escape(cat)}</span><div class="section-line"></div></div>\n'
+        out.append(SECTION_HEADER(SECTION_ID[cat], BADGE_CLASS[cat], escape(cat)))
         if cat == "Others":
-            sections += others_table_html(items)
+            write_others_table(out, items)
         else:
             for rank, story in items:
-                sections += story_card_html(rank, story)
-
-    date_str = target.strftime("%A, %B %d, %Y").upper()
-    navbar_html = get_navbar_html()
-
-    content = f'<div style="margin-top:48px; text-align:center;"><div class="latest-label">Latest Briefing</div></div>{sections}'
+                write_story_card(out, rank, story)
 
-    return wrap_with_layout(
+    head, tail = layout_parts(
         title="HN Daily Digest",
-        date_str=date_str,
+        date_str=target.strftime("%A, %B %d, %Y").upper(),
         subtitle=f"TOP {len(stories)} - {ranking.upper()}",
-        content=content,
-        navbar_html=navbar_html,
+        navbar_html=get_navbar_html(),
+    )
+    return "".join([head, *out, tail])
+
+
+def page_name(target: date, ranking: str) -> str:
+    """Dated page file name: best has no suffix, other rankings do."""
+    return f"{target}.html" if ranking == "best" else f"{target}-{ranking}.html"
+
+
+def plural(n: int, noun: str) -> str:
+    return f"{n} {noun}" if n == 1 else f"{n} {noun}s"
+
+
+def month_page_name(month: str) -> str:
+    return f"archive-{month}.html"
+
+
+def build_month_page(month: str, entries: list) -> str:
+    """Calendar of one month's reports, one cell per day."""
+    year, mon = map(int, month.split("-"))
+    by_day = defaultdict(list)
+    for e in entries:
+        by_day[int(e["date"][8:10])].append(e)
+
+    out = ['<div class="latest"><div class="latest-label">Archive</div></div>']
+    out.append('<div class="cal">')
+    out.extend(f'<div class="cal-dow">{d}</div>' for d in calendar.day_abbr)
+    for week in calendar.Calendar().monthdayscalendar(year, mon):
+        for day in week:
+            if not day:
+                out.append('<div class="cal-day cal-empty"></div>')
+                continue
+            links = "".join(
+                f'<a href="./{escape(e["file"])}" title="{escape(e.get("lead", ""))}">'
+                f"{escape(e['ranking'])} · {e['story_count']}</a>"
+                for e in by_day.get(day, [])
+            )
+            cls = "cal-day has-report" if links else "cal-day"
+            out.append(
+                f'<div class="{cls}"><span class="cal-num">{day}</span>{links}</div>'
+            )
+    out.append("</div>")
+
+    head, tail = layout_parts(
+        title=f"HN Daily Digest - {calendar.month_name[mon]} {year}",
+        date_str=f"{calendar.month_name[mon]} {year}".upper(),
+        subtitle=plural(len(entries), "report").upper(),
+        navbar_html=get_navbar_html(sections=False),
+    )
+    return "".join([head, *out, tail])
+
+
+def build_archive_page(index: dict) -> str:
+    """Landing page listing every archived month, newest first."""
+    out = ['<div class="latest"><div class="latest-label">Archive</div></div>']
+    out.append('<ul class="archive-months">')
+    for key, info in reversed(index["months"].items()):
+        year, mon = map(int, key.split("-"))
+        out.append(
+            f'<li><a href="./{month_page_name(key)}">{calendar.month_name[mon]} {year}</a>'
+            f"<span>{plural(info['count'], 'report')}</span></li>"
+        )
+    out.append("</ul>")
+    total = sum(info["count"] for info in index["months"].values())
+    head, tail = layout_parts(
+        title="HN Daily Digest - Archive",
+        date_str="ARCHIVE",
+        subtitle=plural(total, "report").upper(),
+        navbar_html=get_navbar_html(sections=False),
+    )
+    return "".join([head, *out, tail])
+
+
+def publish(reports: list, ranking: str, homepage: bool = True) -> None:
+    """Write dated pages for (date, stories) pairs and update the archive.
+
+    Only the calendar pages of months that received a report are re-rendered.
+    index.html shows the newest report, so backfilling older dates leaves it
+    alone; with ``homepage`` unset it is never touched.
+    """
+    latest = (ARCHIVE.index().get("latest") or {}).get("date", "")
+    entries, newest = [], None
+    for target, stories in reports:
+        if not stories:
+            print(f"  ⚠ No stories for {target}, nothing archived")
+            continue
+        name = page_name(target, ranking)
+        with METRICS.timer("render"):
+            html = build_index(stories, target, ranking)
+        (OUTPUT_DIR / name).write_text(html, encoding="utf-8")
+        print(f"  ✔ {name} ({len(stories)} stories)")
+        entries.append(
+            {
+                "date": str(target),
+                "file": name,
+                "ranking": ranking,
+                "story_count": len(stories),
+                "lead": stories[0].get("title", ""),
+            }
+        )
+        if str(target) >= latest:
+            latest, newest = str(target), html
+    if not entries:
+        return
+
+    with METRICS.timer("render"):
+        for month in sorted(ARCHIVE.add(entries)):
+            page = build_month_page(month, ARCHIVE.month(month))
+            (OUTPUT_DIR / month_page_name(month)).write_text(page, encoding="utf-8")
+            print(f"  ✔ {month_page_name(month)}")
+        index = ARCHIVE.index()
+        (OUTPUT_DIR / "archive.html").write_text(
+            build_archive_page(index), encoding="utf-8"
+        )
+    total = sum(m["count"] for m in index["months"].values())
+    print(f"  ✔ manifest ({plural(total, 'report')})")
+    if homepage and newest is not None:
+        (OUTPUT_DIR / "index.html").write_text(newest, encoding="utf-8")
+        print("  ✔ index.html")
+
+
+# ── Search Index ──────────────────────────────────────────────────────────────
+
+# A static inverted index for search.html, stored as two tiers. Base terms are
+# spread over ``search_shards`` files by an FNV-1a hash, and base story records
+# over ``search_doc_shards`` files. Stories indexed since the last merge sit in
+# one small delta.json. A daily run rewrites only the delta. Once the delta
+# holds more than ``search_delta_docs`` stories, it is merged into the base
+# shards it touches. A query fetches the delta, one base file per word and the
+# files holding its top hits. Postings live in the story store.
+SEARCH_DIR = OUTPUT_DIR / "search"
+SEARCH_SHARDS = CONFIG.get("search_shards", 512)
+SEARCH_DOC_SHARDS = CONFIG.get("search_doc_shards", 256)
+SEARCH_DELTA_DOCS = CONFIG.get("search_delta_docs", 300)
+# Title words count most; only the most frequent summary words are indexed.
+SEARCH_BOOSTS = {"title": 8, "key_points": 3, "sentiments": 2, "summary": 1}
+SEARCH_SUMMARY_TERMS = 40
+STOPWORDS = frozenset(
+    "about after all also an and any are as at be been but by can could did do"
+    " does for from had has have how if in into is it its just like more most"
+    " my no not now of on one only or other our out over so some such than"
+    " that the their them then there these they this those to too up us was"
+    " we were what when which who why will with would you your".split()
+)
+
+SEARCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS postings (
+    shard INTEGER NOT NULL, term TEXT NOT NULL, object_id TEXT NOT NULL,
+    weight INTEGER NOT NULL, delta INTEGER NOT NULL,
+    PRIMARY KEY (shard, term, object_id)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_object ON postings (object_id);
+CREATE INDEX IF NOT EXISTS postings_delta ON postings (delta);
+CREATE TABLE IF NOT EXISTS search_docs (
+    object_id TEXT PRIMARY KEY, shard INTEGER NOT NULL, doc TEXT NOT NULL,
+    delta INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS search_docs_shard ON search_docs (shard);
+CREATE TABLE IF NOT EXISTS search_files (name TEXT PRIMARY KEY, hash TEXT NOT NULL);
+"""
+
+
+def fnv1a(text: str) -> int:
+    """32-bit FNV-1a of the UTF-8 bytes; search.js computes the same hash."""
+    h = 0x811C9DC5
+    for b in text.encode("utf-8"):
+        h = ((h ^ b) * 0x01000193) & 0xFFFFFFFF
+    return h
+
+
+def search_tokens(text: str) -> list:
+    """Lowercased words without stopwords, with plurals folded (as search.js)."""
+    tokens = []
+    for t in re.findall(r"[^\W_]+", text.lower()):
+        if len(t) < 2 or len(t) > 32 or t in STOPWORDS:
+            continue
+        if len(t) > 4 and t.endswith("ies"):
+            t = t[:-3] + "y"
+        elif len(t) > 3 and t.endswith("s") and not t.endswith("ss"):
+            t = t[:-1]
+        tokens.append(t)
+    return tokens
+
+
+def search_terms(title: str, analysis: dict) -> dict:
+    """Weighted terms of one story: boost per field times occurrences."""
+    weights = defaultdict(int)
+    for t in search_tokens(title):
+        weights[t] += SEARCH_BOOSTS["title"]
+    for kp in analysis.get("key_points", []):
+        for t in search_tokens(kp):
+            weights[t] += SEARCH_BOOSTS["key_points"]
+    for s in analysis.get("sentiments", []):
+        for t in search_tokens(s.get("label", "")):
+            weights[t] += SEARCH_BOOSTS["sentiments"]
+    counts = defaultdict(int)
+    for p in analysis.get("summary_paragraphs", []):
+        for t in search_tokens(p):
+            counts[t] += 1
+    top = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))[:SEARCH_SUMMARY_TERMS]
+    for t, n in top:
+        weights[t] += n * SEARCH_BOOSTS["summary"]
+    return {t: min(w, 255) for t, w in weights.items()}
+
+
+def _posting_id(oid: str):
+    return int(oid) if oid.isdigit() else oid
+
+
+class SearchIndex:
+    """Incremental builder of the two-tier index under ``site/search/``.
+
+    ``update(ids)`` re-indexes those stories from the story store into the
+    delta tier. It rewrites a base shard only when one of the stories was
+    already in the base, or when the delta is merged. ``meta.json`` lists a
+    content hash per file, so clients can cache shards and still pick up a
+    changed one.
+    """
+
+    def __init__(self, store: DigestStore, root: Path = SEARCH_DIR):
+        self.store = store
+        self.root = root
+        self._conn = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.store.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.store.path, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(STORE_SCHEMA + SEARCH_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _stories(self, ids: list) -> list:
+        """(object_id, title, points, analysis, first listing) per story."""
+        db, rows, pages = self._db(), [], {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start : start + 500]
+            marks = ",".join("?" * len(chunk))
+            rows += db.execute(
+                "SELECT s.object_id, s.title, s.points, a.analysis FROM stories s"
+                " LEFT JOIN analyses a ON a.object_id = s.object_id"
+                f" WHERE s.object_id IN ({marks})",
+                chunk,
+            ).fetchall()
+            for oid, day, ranking in db.execute(
+                "SELECT object_id, date, ranking FROM listings"
+                f" WHERE object_id IN ({marks}) ORDER BY date DESC",
+                chunk,
+            ):
+                pages[oid] = (day, ranking)
+        return [(*row, pages.get(row[0])) for row in rows]
+
+    def needs_rebuild(self) -> bool:
+        """True on first use or after the shard counts changed."""
+        stored = (
+            self._db()
+            .execute("SELECT hash FROM search_files WHERE name = 'layout'")
+            .fetchone()
+        )
+        return stored is None or stored[0] != f"{SEARCH_SHARDS}/{SEARCH_DOC_SHARDS}"
+
+    def update(self, ids: list) -> int:
+        """Re-index ``ids`` (every stored story on first use); returns files written."""
+        db = self._db()
+        layout = f"{SEARCH_SHARDS}/{SEARCH_DOC_SHARDS}"
+        rebuild = self.needs_rebuild()
+        if rebuild:
+            # First run, or the shard counts changed: index everything into base.
+            db.executescript(
+                "DELETE FROM postings; DELETE FROM search_docs; DELETE FROM search_files;"
+            )
+            db.execute("INSERT INTO search_files VALUES ('layout', ?)", (layout,))
+            ids = [oid for (oid,) in db.execute("SELECT object_id FROM stories")]
+        ids = sorted(set(map(str, ids)))
+        delta = 0 if rebuild else 1
+
+        postings, docs = [], []
+        for oid, title, points, analysis, page in self._stories(ids):
+            if page is None:
+                continue
+            day, ranking = page
+            terms = search_terms(title or "", json.loads(analysis) if analysis else {})
+            postings += [
+                (fnv1a(t) % SEARCH_SHARDS, t, oid, w, delta) for t, w in terms.items()
+            ]
+            doc = [title, page_name(date.fromisoformat(day), ranking), day, points]
+            docs.append(
+                (
+                    oid,
+                    fnv1a(oid) % SEARCH_DOC_SHARDS,
+                    json.dumps(doc, ensure_ascii=False),
+                    delta,
+                )
+            )
+
+        db.execute("BEGIN")
+        try:
+            # Base files that lose a re-indexed story must be rewritten too.
+            shards, doc_shards = set(), set()
+            for start in range(0, len(ids), 500):
+                chunk = ids[start : start + 500]
+                marks = ",".join("?" * len(chunk))
+                shards.update(
+                    s
+                    for (s,) in db.execute(
+                        "SELECT DISTINCT shard FROM postings"
+                        f" WHERE delta = 0 AND object_id IN ({marks})",
+                        chunk,
+                    )
+                )
+                doc_shards.update(
+                    s
+                    for (s,) in db.execute(
+                        "SELECT shard FROM search_docs"
+                        f" WHERE delta = 0 AND object_id IN ({marks})",
+                        chunk,
+                    )
+                )
+                db.execute(f"DELETE FROM postings WHERE object_id IN ({marks})", chunk)
+                db.execute(
+                    f"DELETE FROM search_docs WHERE object_id IN ({marks})", chunk
+                )
+            db.executemany("INSERT INTO postings VALUES (?, ?, ?, ?, ?)", postings)
+            db.executemany("INSERT INTO search_docs VALUES (?, ?, ?, ?)", docs)
+
+            (pending,) = db.execute(
+                "SELECT COUNT(*) FROM search_docs WHERE delta = 1"
+            ).fetchone()
+            if rebuild or pending > SEARCH_DELTA_DOCS:
+                shards.update(
+                    s
+                    for (s,) in db.execute(
+                        "SELECT DISTINCT shard FROM postings WHERE delta = 1"
+                    )
+                )
+                doc_shards.update(
+                    s
+                    for (s,) in db.execute(
+                        "SELECT DISTINCT shard FROM search_docs WHERE delta = 1"
+                    )
+                )
+                if rebuild:
+                    shards.update(p[0] for p in postings)
+                    doc_shards.update(d[1] for d in docs)
+                db.execute("UPDATE postings SET delta = 0 WHERE delta = 1")
+                db.execute("UPDATE search_docs SET delta = 0 WHERE delta = 1")
+
+            written = [self._write_terms(s) for s in sorted(shards)]
+            written += [self._write_docs(s) for s in sorted(doc_shards)]
+            written.append(self._write_delta())
+            db.executemany("INSERT OR REPLACE INTO search_files VALUES (?, ?)", written)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        self._write_meta()
+        return len(written)
+
+    def _write(self, name: str, value) -> tuple:
+        data = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        return name, hashlib.sha256(data).hexdigest()[:10]
+
+    def _terms(self, where: str, args: tuple) -> dict:
+        terms = defaultdict(list)
+        for term, oid, weight in self._db().execute(
+            f"SELECT term, object_id, weight FROM postings WHERE {where}"
+            " ORDER BY term, weight DESC",
+            args,
+        ):
+            terms[term] += [_posting_id(oid), weight]
+        return terms
+
+    def _docs(self, where: str, args: tuple) -> dict:
+        rows = self._db().execute(
+            f"SELECT object_id, doc FROM search_docs WHERE {where}", args
+        )
+        return {oid: json.loads(d) for oid, d in rows}
+
+    def _write_terms(self, shard: int) -> tuple:
+        terms = self._terms("shard = ? AND delta = 0", (shard,))
+        return self._write(f"t/{shard}.json", terms)
+
+    def _write_docs(self, shard: int) -> tuple:
+        return self._write(
+            f"d/{shard}.json", self._docs("shard = ? AND delta = 0", (shard,))
+        )
+
+    def _write_delta(self) -> tuple:
+        return self._write(
+            "delta.json",
+            {"t": self._terms("delta = 1", ()), "d": self._docs("delta = 1", ())},
+        )
+
+    def _write_meta(self) -> None:
+        files = dict(self._db().execute("SELECT name, hash FROM search_files"))
+        (docs,) = self._db().execute("SELECT COUNT(*) FROM search_docs").fetchone()
+        self._write(
+            "meta.json",
+            {
+                "docs": docs,
+                "shards": SEARCH_SHARDS,
+                "doc_shards": SEARCH_DOC_SHARDS,
+                "delta": files.get("delta.json", ""),
+                "t": [files.get(f"t/{s}.json", "") for s in range(SEARCH_SHARDS)],
+                "d": [files.get(f"d/{s}.json", "") for s in range(SEARCH_DOC_SHARDS)],
+            },
+        )
+
+
+SEARCH = SearchIndex(STORE)
+
+SEARCH_JS = r"""(() => {
+  const STOP = new Set(__STOPWORDS__);
+  const root = "./search/";
+  const files = new Map();
+  const load = (path, fresh) => {
+    if (!files.has(path)) {
+      files.set(path, fetch(root + path, fresh ? { cache: "no-cache" } : {})
+        .then((r) => (r.ok ? r.json() : {})));
+    }
+    return files.get(path);
+  };
+  const fnv = (s) => {
+    let h = 0x811c9dc5;
+    for (const b of new TextEncoder().encode(s)) h = Math.imul(h ^ b, 0x01000193);
+    return h >>> 0;
+  };
+  const tokens = (text) => (text.toLowerCase().match(/[\p{L}\p{N}]+/gu) || [])
+    .filter((t) => t.length > 1 && t.length <= 32 && !STOP.has(t))
+    .map((t) => t.length > 4 && t.endsWith("ies") ? t.slice(0, -3) + "y"
+      : t.length > 3 && t.endsWith("s") && !t.endsWith("ss") ? t.slice(0, -1) : t);
+
+  async function search(query) {
+    const meta = await load("meta.json", true);
+    const delta = { t: {}, d: {}, ...(await load(`delta.json?${meta.delta}`)) };
+    const terms = [...new Set(tokens(query))];
+    const lists = await Promise.all(terms.map(async (t) => {
+      const s = fnv(t) % meta.shards;
+      const base = meta.t[s] ? (await load(`t/${s}.json?${meta.t[s]}`))[t] || [] : [];
+      return base.concat(delta.t[t] || []);
+    }));
+    const score = new Map(), matched = new Map();
+    for (const p of lists) {
+      const idf = Math.log(1 + meta.docs / Math.max(p.length / 2, 1));
+      for (let i = 0; i < p.length; i += 2) {
+        const id = String(p[i]);
+        score.set(id, (score.get(id) || 0) + p[i + 1] * idf);
+        matched.set(id, (matched.get(id) || 0) + 1);
+      }
+    }
+    let ids = [...score.keys()];
+    const all = ids.filter((id) => matched.get(id) === terms.length);
+    if (all.length) ids = all;
+    ids.sort((a, b) => score.get(b) - score.get(a));
+    return Promise.all(ids.slice(0, 30).map(async (id) => {
+      if (delta.d[id]) return [id, delta.d[id]];
+      const s = fnv(id) % meta.doc_shards;
+      return [id, meta.d[s] ? (await load(`d/${s}.json?${meta.d[s]}`))[id] : null];
+    }));
+  }
+
+  const input = document.getElementById("search-input");
+  const status = document.getElementById("search-status");
+  const list = document.getElementById("search-results");
+  let timer, seq = 0;
+  async function run() {
+    const query = input.value.trim(), mine = ++seq;
+    history.replaceState(null, "", query ? "#q=" + encodeURIComponent(query) : "#");
+    if (!tokens(query).length) { list.replaceChildren(); status.textContent = ""; return; }
+    const t0 = performance.now();
+    const hits = (await search(query)).filter(([, d]) => d);
+    if (mine !== seq) return;
+    list.replaceChildren(...hits.map(([id, [title, file, day, points]]) => {
+      const li = document.createElement("li");
+      const a = document.createElement("a");
+      a.href = "./" + file;
+      a.textContent = title;
+      const meta = document.createElement("span");
+      meta.className = "search-meta";
+      meta.textContent = `${day} · ${points} pts`;
+      li.append(a, meta);
+      return li;
+    }));
+    status.textContent = `${hits.length} result${hits.length === 1 ? "" : "s"}`
+      + ` · ${Math.round(performance.now() - t0)} ms`;
+  }
+  input.addEventListener("input", () => { clearTimeout(timer); timer = setTimeout(run, 150); });
+  const q = new URLSearchParams(location.hash.slice(1)).get("q");
+  if (q) { input.value = q; run(); }
+})();
+"""
+
+
+def search_script_href() -> str:
+    """URL of ``assets/search.<hash>.js``; write_assets() writes the file."""
+    js = SEARCH_JS.replace("__STOPWORDS__", json.dumps(sorted(STOPWORDS))).encode()
+    href = f"assets/search.{hashlib.sha256(js).hexdigest()[:12]}.js"
+    _ASSETS[href] = js
+    return href
+
+
+def build_search_page() -> str:
+    out = [
+        '<div class="latest"><div class="latest-label">Search</div></div>',
+        '<div class="search-box"><input id="search-input" type="search" '
+        'placeholder="Search every digest…" autocomplete="off" autofocus></div>',
+        '<div id="search-status" class="search-status"></div>',
+        '<ol id="search-results" class="search-results"></ol>',
+        f'<script src="{search_script_href()}" defer></script>',
+    ]
+    head, tail = layout_parts(
+        title="HN Daily Digest - Search",
+        date_str="SEARCH",
+        subtitle="EVERY ARCHIVED DIGEST",
+        navbar_html=get_navbar_html(sections=False),
+    )
+    return "".join([head, *out, tail])
+
+
+def update_search(reports: list) -> None:
+    """Index the reports' stories; never rebuild from a store missing archived days.
+
+    A full rebuild rewrites every shard from the store alone. If the store
+    was lost (e.g. a fresh CI cache), that would publish a near-empty index
+    over the deployed one, so the index is left alone instead.
+    """
+    if SEARCH.needs_rebuild():
+        missing = STORE.missing(ARCHIVE.entries())
+        if missing:
+            print(
+                f"  ⚠ search index not rebuilt: {STORE.path} lacks "
+                f"{plural(len(missing), 'archived report')} (e.g. {missing[0]['file']}). "
+                "Restore the store, or backfill those dates, first."
+            )
+            return
+    ids = [s.get("objectID") for _, stories in reports for s in stories]
+    with METRICS.timer("search"):
+        written = SEARCH.update([oid for oid in ids if oid])
+        (OUTPUT_DIR / "search.html").write_text(build_search_page(), encoding="utf-8")
+    print(f"  ✔ search index: {plural(written, 'file')} written")
+
+
+# ── Build Output ──────────────────────────────────────────────────────────────
+
+# After rendering, pages are minified and every page and asset gets .gz / .br
+# siblings for servers that serve precompressed files (nginx gzip_static,
+# brotli_static). Files whose hash matches the last build are skipped.
+BUILD_STATE = CACHE_DIR / "build-state.json"
+MINIFY_HTML = CONFIG.get("minify_html", True)
+PRECOMPRESS = CONFIG.get("precompress", True)
+COMPRESSIBLE = {".html", ".css", ".js", ".json", ".svg", ".xml", ".txt"}
+COMPRESS_MIN_BYTES = 256
+BUILD_WORKERS = CONFIG.get("build_workers", os.cpu_count() or 4)
+
+_BLOCK_TAGS = (
+    "html|head|body|meta|link|title|div|p|table|thead|tbody|tr|td|th|ul|ol|li|"
+    "h[1-6]|noscript|!DOCTYPE"
+)
+_HTML_RAW = re.compile(r"(<(pre|textarea|script|style)\b.*?</\2>)", re.S | re.I)
+_HTML_WS = re.compile(r"\s+")
+_HTML_BLOCK_WS = re.compile(rf"\s*(</?(?:{_BLOCK_TAGS})\b[^>]*>)\s*", re.I)
+
+
+def minify_html(html: str) -> str:
+    """Collapse whitespace without changing how the page renders.
+
+    Whitespace runs shrink to one character, and whitespace next to
+    block-level tags is dropped. The contents of pre, textarea, script and
+    style are left alone.
+    """
+    parts = _HTML_RAW.split(html)
+    out = []
+    # split() yields text, raw block, tag name, text, ...
+    for i in range(0, len(parts), 3):
+        text = _HTML_WS.sub(lambda m: "\n" if "\n" in m.group() else " ", parts[i])
+        out.append(_HTML_BLOCK_WS.sub(r"\1", text))
+        if i + 1 < len(parts):
+            out.append(parts[i + 1])
+    return "".join(out).strip()
+
+
+def _minified(path: Path, data: bytes) -> bytes:
+    if MINIFY_HTML and path.suffix == ".html":
+        return minify_html(data.decode("utf-8")).encode("utf-8")
+    return data
+
+
+def _build_file(path: Path, state: dict) -> dict:
+    """Minify and compress one file; returns its new state and sizes."""
+    data = path.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    siblings = [path.with_name(path.name + ".gz")]
+    if brotli is not None:
+        siblings.append(path.with_name(path.name + ".br"))
+    compress = PRECOMPRESS and len(data) >= COMPRESS_MIN_BYTES
+    if not compress or all(s.exists() for s in siblings):
+        if digest == state.get("out"):
+            return {**state, "skipped": True}
+        if digest == state.get("src"):
+            # Re-rendered identically: restore the minified page and keep
+            # the existing siblings.
+            path.write_bytes(_minified(path, data))
+            return {**state, "skipped": True}
+
+    out = _minified(path, data)
+    if out != data:
+        path.write_bytes(out)
+    entry = {
+        "src": digest,
+        "out": hashlib.sha256(out).hexdigest(),
+        "raw": len(data),
+        "min": len(out),
+    }
+    if compress:
+        gz = gzip.compress(out, compresslevel=9, mtime=0)
+        siblings[0].write_bytes(gz)
+        entry["gz"] = len(gz)
+        if brotli is not None:
+            br = brotli.compress(out, quality=11)
+            siblings[1].write_bytes(br)
+            entry["br"] = len(br)
+    return entry
+
+
+def build_site(root: Path = OUTPUT_DIR) -> dict:
+    """Write the registered assets, then minify and precompress what changed.
+
+    Runs on a thread pool: zlib and brotli release the GIL while compressing.
+    Orphaned .gz / .br files are removed. Prints a before/after size report
+    and returns the per-file state written to ``.cache/build-state.json``.
+    """
+    write_assets(root)
+    try:
+        previous = json.loads(BUILD_STATE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        previous = {}
+
+    for sibling in [*root.rglob("*.gz"), *root.rglob("*.br")]:
+        if not sibling.with_suffix("").exists():
+            sibling.unlink()
+
+    files = [p for p in sorted(root.rglob("*")) if p.suffix in COMPRESSIBLE]
+    keys = [p.relative_to(root).as_posix() for p in files]
+    with ThreadPoolExecutor(
+        max_workers=BUILD_WORKERS, thread_name_prefix="build"
+    ) as ex:
+        entries = list(
+            ex.map(lambda p, k: _build_file(p, previous.get(k, {})), files, keys)
+        )
+
+    built = [e for e in entries if not e.pop("skipped", False)]
+    state = dict(zip(keys, entries))
+    BUILD_STATE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = BUILD_STATE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=1), encoding="utf-8")
+    os.replace(tmp, BUILD_STATE)
+
+    raw = sum(e["raw"] for e in built)
+    minified = sum(e["min"] for e in built)
+    print(
+        f"  ✔ build: {len(built)} file(s) rebuilt, "
+        f"{len(entries) - len(built)} unchanged"
     )
+    if built:
+
+        def pct(n: int) -> str:
+            return f"{n / 1024:8.1f} KB ({n / raw:6.1%})" if raw else "-"
+
+        print(f"    raw      {pct(raw)}")
+        print(f"    minified {pct(minified)}")
+        for ext in ("gz", "br"):
+            done = [e for e in built if ext in e]
+            if done:
+                # Files below COMPRESS_MIN_BYTES are served uncompressed.
+                size = sum(e[ext] for e in done)
+                size += sum(e["min"] for e in built if ext not in e)
+                print(f"    {ext:<8} {pct(size)}")
+    for ext in ("raw", "min", "gz", "br"):
+        METRICS.inc("build_bytes", sum(e.get(ext, 0) for e in built), kind=ext)
+    return state
+
+
+# ── Profiling ─────────────────────────────────────────────────────────────────
+
+
+class _ProfileSnapshot:
+    """Stats of a (possibly still running) profiler, for ``pstats.Stats``.
+
+    ``pstats.Stats(profile)`` would call ``disable()`` on the *calling*
+    thread, which is wrong for a profiler that belongs to a worker thread.
+    """
+
+    def __init__(self, profile):
+        profile.snapshot_stats()
+        self.stats = profile.stats
+
+    def create_stats(self):
+        pass
+
+
+class RunProfiler:
+    """cProfile for CPU time plus a wall-clock stack sampler, for ``--profile``.
+
+    Every thread started while active gets its own cProfile (via
+    ``threading.setprofile``); they are merged into one ``cpu.pstats``. From
+    Python 3.12 cProfile sits on ``sys.monitoring``, which allows only one
+    active profiler, so there only the main thread is CPU-profiled. A
+    sampler thread snapshots all stacks every ``interval`` seconds, so time
+    spent blocked on sockets, locks and pools shows up too, and writes them
+    as ``wall.collapsed`` (Brendan Gregg's folded format, for flamegraph.pl
+    or speedscope). Nothing is installed unless the profiler is entered.
+    """
+
+    PER_THREAD = sys.version_info < (3, 12)
+
+    def __init__(self, directory: Path, interval: float = 0.005):
+        self.directory = directory
+        self.interval = interval
+        self.profiles = []
+        self.stacks = defaultdict(int)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def _thread_hook(self, frame, event, arg):
+        profile = cProfile.Profile()
+        with self._lock:
+            self.profiles.append(profile)
+        profile.enable()
+
+    def _sample(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name})")
+                    frame = frame.f_back
+                # Pool threads are named prefix_N; fold them into one root.
+                thread = re.sub(r"_\d+$", "", names.get(ident, "thread"))
+                self.stacks[";".join([thread, *reversed(stack)])] += 1
+
+    def __enter__(self):
+        self._sampler = threading.Thread(
+            target=self._sample, name="wall-sampler", daemon=True
+        )
+        self._sampler.start()
+        self.main = cProfile.Profile()
+        if self.PER_THREAD:
+            threading.setprofile(self._thread_hook)
+        else:
+            print(
+                "  ⚠ Python 3.12+: cpu.pstats covers the main thread only; "
+                "wall.collapsed still samples every thread"
+            )
+        self.main.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.main.disable()
+        threading.setprofile(None)
+        self._stop.set()
+        self._sampler.join()
+        self.write()
+
+    def write(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stats = pstats.Stats(_ProfileSnapshot(self.main))
+        with self._lock:
+            for profile in self.profiles:
+                stats.add(_ProfileSnapshot(profile))
+        stats.dump_stats(self.directory / "cpu.pstats")
+        (self.directory / "wall.collapsed").write_text(
+            "".join(f"{stack} {n}\n" for stack, n in sorted(self.stacks.items())),
+            encoding="utf-8",
+        )
+        print(f"  ✔ profiles → {self.directory}/cpu.pstats, wall.collapsed")
+        stats.sort_stats("cumulative").print_stats(15)
 
 
 # ── Entry Point ───────────────────────────────────────────────────────────────
 
 
-def run(target: date, ranking: str, n_stories: int):
-    print(f"  Date={target}  Ranking={ranking}  Stories={n_stories}")
+def fallback_analysis(story: dict) -> dict:
+    """Placeholder analysis rendered when the AI stage fails for a story."""
+    return {
+        "topic_category": "Others",
+        "summary_paragraphs": [
+            story.get("title", ""),
+            "Analysis unavailable.",
+        ],
+        "highlight": "",
+        "key_points": [],
+        "sentiments": [],
+        "fallback": True,
+    }
+
+
+def process_stories(stories: list, batch: bool = False, on_done=None) -> None:
+    """Scrape, fetch comments and analyse every story through a staged pipeline.
+
+    Article scraping and comment fetching run on their own bounded pools and
+    feed a separate AI stage, so all three overlap: while story N is being
+    analysed, the inputs for the following stories are already downloading.
+    AI throughput is paced by the provider's shared rate limiter.
+
+    With ``batch`` set, low-engagement stories are grouped into multi-story
+    requests (see analyze_batch) up to ``batch_token_budget`` prompt tokens.
+    Each story dict gets its ``analysis`` filled in place; order is untouched.
+    Articles are fetched once per canonical URL and comments once per
+    objectID, and ``on_done(story)`` is called after every successful
+    analysis (not for fallbacks), e.g. to checkpoint it.
+
+    A story that duplicates one analysed on an earlier day (see
+    ``DigestStore.twin``) keeps that summary and only has its sentiments
+    refreshed. When the canonical URL already matches, the article is not
+    even scraped.
+    """
+    total = len(stories)
+    budget = CONFIG.get("batch_token_budget", 12_000)
+    max_comments = CONFIG.get("batch_max_comments", 30)
+    max_stories = CONFIG.get("batch_max_stories", 6)
+
+    def scrape(url):
+        t0 = time.time()
+        article = fetch_article(url)
+        METRICS.observe("stage_seconds", time.time() - t0, stage="article")
+        return article, time.time() - t0
+
+    def comments(hn_id):
+        t0 = time.time()
+        cmts = get_top_comments(int(hn_id)) if hn_id else []
+        METRICS.observe("stage_seconds", time.time() - t0, stage="comments")
+        return cmts, time.time() - t0
+
+    def done(story):
+        if on_done:
+            on_done(story)
+
+    def report(i, story, status):
+        title = story.get("title", "")[:65]
+        prompt = PROMPT_REPORT.get(str(story.get("objectID", "")))
+        if prompt:
+            status += (
+                f" | Prompt: ~{prompt['total']} tok (article {prompt['article']}, "
+                f"comments {prompt['comments']}, schema {prompt['schema']}"
+                + (", trimmed)" if prompt["trimmed"] else ")")
+            )
+        print(f"  [{i + 1:02}/{total}] {title}\n         {status}")
+
+    def analyse(i, story, article, cmts, t_article, t_comments):
+        t0 = time.time()
+        try:
+            story["analysis"] = analyze_story(story, article, cmts)
+            t_ai = time.time() - t0
+            METRICS.observe("stage_seconds", t_ai, stage="ai")
+            status = (
+                f"⏱  Scrape: {t_article:.1f}s | HN: {t_comments:.1f}s | AI: {t_ai:.1f}s"
+            )
+            done(story)
+        except Exception as e:
+            status = f"⚠ Analysis error: {e}"
+            story["analysis"] = fallback_analysis(story)
+            METRICS.inc("analysis_fallbacks")
+        report(i, story, status)
+
+    def reuse(i, story, article, cmts, twin, t_article, t_comments):
+        source, previous, match = twin
+        t0 = time.time()
+        try:
+            story["analysis"] = refresh_sentiments(story, cmts, source, previous)
+        except Exception as e:
+            # Like a cache miss: analyse from scratch, scraping if that was skipped.
+            print(f"         ⚠ Refreshing sentiments from {source} failed: {e}")
+            if not article and story.get("url"):
+                article, t_article = scrape(story["url"])
+            analyse(i, story, article, cmts, t_article, t_comments)
+            return
+        t_ai = time.time() - t0
+        METRICS.observe("stage_seconds", t_ai, stage="ai_sentiment")
+        status = (
+            f"♻  Summary of {source} reused ({match}) | Scrape: {t_article:.1f}s"
+            f" | HN: {t_comments:.1f}s | AI (sentiment): {t_ai:.1f}s"
+        )
+        METRICS.inc("dedup_reused", match=match)
+        done(story)
+        report(i, story, status)
+
+    def analyse_batch(group):
+        t0 = time.time()
+        try:
+            results = analyze_batch([(s, a, c) for _, s, a, c, _, _ in group])
+        except Exception as e:
+            print(
+                f"         ⚠ Batch of {len(group)} failed ({e}); falling back per story"
+            )
+            results = {}
+        t_ai = time.time() - t0
+        METRICS.observe("stage_seconds", t_ai, stage="ai_batch")
+        for i, story, article, cmts, t_article, t_comments in group:
+            analysis = results.get(str(story.get("objectID")))
+            if analysis is None:
+                analyse(i, story, article, cmts, t_article, t_comments)
+                continue
+            story["analysis"] = analysis
+            done(story)
+            report(
+                i,
+                story,
+                f"⏱  Scrape: {t_article:.1f}s | HN: {t_comments:.1f}s | "
+                f"AI: {t_ai:.1f}s (batch of {len(group)})",
+            )
+
+    with (
+        ThreadPoolExecutor(
+            max_workers=CONFIG.get("scrape_workers", 8), thread_name_prefix="scrape"
+        ) as scrape_ex,
+        ThreadPoolExecutor(
+            max_workers=CONFIG.get("comment_workers", 4), thread_name_prefix="hn"
+        ) as hn_ex,
+        ThreadPoolExecutor(
+            max_workers=CONFIG.get("ai_workers", 1), thread_name_prefix="ai"
+        ) as ai_ex,
+    ):
+        by_url, by_id, twins, article_futs = {}, {}, {}, []
+        for i, s in enumerate(stories):
+            url, hn_id = s.get("url", "") or "", s.get("objectID", "")
+            twins[i] = STORE.twin_by_url(s)
+            if twins[i]:
+                skipped = Future()
+                skipped.set_result(("", 0.0))
+                article_futs.append(skipped)
+            else:
+                key = canonical_url(url) or url
+                if key not in by_url:
+                    by_url[key] = scrape_ex.submit(scrape, url)
+                article_futs.append(by_url[key])
+            if hn_id not in by_id:
+                by_id[hn_id] = hn_ex.submit(comments, hn_id)
+        comment_futs = [by_id[s.get("objectID", "")] for s in stories]
+
+        # Dispatch to the AI stage in story order as inputs become ready.
+        ai_futs, group, group_tokens = [], [], 0
+        for i, story in enumerate(stories):
+            article, t_article = article_futs[i].result()
+            cmts, t_comments = comment_futs[i].result()
+            STORE.record_inputs(story, article, cmts)
+            twin = twins[i] or STORE.twin(story, article)
+            if twin:
+                ai_futs.append(
+                    ai_ex.submit(
+                        reuse, i, story, article, cmts, twin, t_article, t_comments
+                    )
+                )
+                continue
+            job = (i, story, article, cmts, t_article, t_comments)
+
+            tokens = min(
+                estimate_tokens(article), PROMPT_BUDGETS["article"]
+            ) + estimate_tokens(format_comments(cmts))
+            if (
+                not batch
+                or story.get("num_comments", 0) > max_comments
+                or tokens > budget
+            ):
+                ai_futs.append(ai_ex.submit(analyse, *job))
+                continue
+            if group and (group_tokens + tokens > budget or len(group) >= max_stories):
+                ai_futs.append(ai_ex.submit(analyse_batch, group))
+                group, group_tokens = [], 0
+            group.append(job)
+            group_tokens += tokens
+        if group:
+            ai_futs.append(ai_ex.submit(analyse_batch, group))
+
+        for f in ai_futs:
+            f.result()
+
+
+def report_run_stats() -> None:
+    for name, cache in (
+        ("Analysis", ANALYSIS_CACHE),
+        ("Article", ARTICLE_CACHE),
+        ("HN item", ITEM_STORE),
+    ):
+        removed = cache.evict()
+        print(
+            f"  {name} cache: {cache.hits} hits, {cache.misses} misses, "
+            f"{removed} evicted"
+        )
+        label = name.lower().replace(" ", "_")
+        METRICS.inc("cache_hits", cache.hits, cache=label)
+        METRICS.inc("cache_misses", cache.misses, cache=label)
+
+    for host, c in sorted(HTTP.stats().items(), key=lambda kv: -kv[1]["requests"]):
+        print(
+            f"  HTTP {host}: {c['requests']} requests, "
+            f"{c['opened']} connections opened, {c['reused']} reused"
+        )
+        METRICS.inc("http_requests", c["requests"], host=host)
+        METRICS.inc("http_connections_opened", c["opened"], host=host)
+
+    if PROMPT_REPORT:
+        totals = [p["total"] for p in PROMPT_REPORT.values()]
+        trimmed = sum(p["trimmed"] for p in PROMPT_REPORT.values())
+        print(
+            f"  Prompts: {len(totals)} stories, ~{percentile(totals, 0.5)} tokens "
+            f"median, ~{max(totals)} max, {trimmed} articles trimmed"
+        )
+
+    for provider, h in ROUTER.stats().items():
+        if h["calls"]:
+            ttft, aborts = h["ttft_p50_s"], h["stream_aborts"]
+            print(
+                f"  LLM {provider}: {h['calls']} calls, {h['errors']} errors, "
+                f"{h['hedges']} hedge requests, p95 {h['p95_s']}s"
+                + (f", TTFT p50 {ttft}s" if ttft is not None else "")
+                + (f", {aborts} streams cancelled" if aborts else "")
+                + (" (breaker open)" if h["breaker_open"] else "")
+            )
+
+
+def finish(reports: dict, store: bool = True) -> None:
+    """Store the run's results, then write pages, archive and build output.
+
+    ``reports`` maps each ranking to its (date, stories) pairs. index.html
+    follows the first ranking.
+    """
+    if store:
+        with METRICS.timer("store"):
+            n = sum(STORE.save(pairs, ranking) for ranking, pairs in reports.items())
+        if n:
+            print(f"  ✔ store: {n} listed stories → {STORE.path}")
+    for i, (ranking, pairs) in enumerate(reports.items()):
+        publish(pairs, ranking, homepage=i == 0)
+    update_search([pair for pairs in reports.values() for pair in pairs])
+    with METRICS.timer("build"):
+        build_site()
+
+
+def rerender(days: list | None, rankings: list) -> None:
+    """Rebuild pages from the story store alone: no network, no LLM calls."""
+    wanted = {str(d) for d in days} if days else None
+    missing = STORE.missing(
+        [
+            e
+            for e in ARCHIVE.entries()
+            if e["ranking"] in rankings and (wanted is None or e["date"] in wanted)
+        ]
+    )
+    if missing:
+        print(
+            f"  ⚠ {plural(len(missing), 'archived report')} not in {STORE.path} "
+            f"(e.g. {missing[0]['file']}) will not be re-rendered"
+        )
+    reports = {}
+    for ranking in rankings:
+        dates = days or STORE.dates(ranking)
+        print(
+            f"  Re-rendering {len(dates)} day(s) from {STORE.path}  Ranking={ranking}"
+        )
+        reports[ranking] = [(d, STORE.load(d, ranking)) for d in dates]
+    finish(reports, store=False)
+
+
+def print_rollup(ranking: str) -> None:
+    print(f"  Ranking={ranking}")
+    for w in STORE.weekly_rollup(ranking):
+        topics = ", ".join(f"{t} {n}" for t, n in sorted(w["topics"].items()))
+        print(
+            f"  {w['week']} ({w['from']} → {w['to']}): {w['stories']} stories, "
+            f"{w['points']} pts | {topics}"
+        )
+        if w["top"]:
+            print(f"           top: {w['top'][0]} ({w['top'][1]} pts)")
+
+
+def run(target: date, rankings: list, n_stories: int, batch: bool = False):
+    print(f"  Date={target}  Ranking={','.join(rankings)}  Stories={n_stories}")
 
     print("  Fetching story list...")
-    stories = get_stories_for_date(target, n=n_stories, ranking=ranking)
+    lists = fetch_story_lists([target], rankings, n_stories)
+    stories = list(
+        {s.get("objectID"): s for listed in lists.values() for s in listed}.values()
+    )
 
     if stories:
         print(f"  Found {len(stories)} stories. Starting analysis...")
-        for i, story in enumerate(stories):
-            title = story.get("title", "")[:65]
-            print(f"  [{i+1:02}/{len(stories)}] {title}")
-            hn_id = story.get("objectID", "")
+        process_stories(stories, batch=batch)
+
+    report_run_stats()
+    finish({r: [(target, lists[target, r])] for r in rankings})
 
-            t0 = time.time()
-            article = fetch_article(story.get("url", ""))
-            t_article = time.time() - t0
 
-            t0 = time.time()
-            comments = get_top_comments(int(hn_id)) if hn_id else []
-            t_comments = time.time() - t0
+class Checkpoint:
+    """Per-story analysis checkpoints for one backfill, so a crash can resume.
 
-            t0 = time.time()
+    One JSON file per objectID under ``.cache/checkpoints/<run key>/``; the
+    run key covers the date range, ranking, story count, the providers the
+    router may use with their models, and the prompt version, so a resumed
+    run only reuses work that matches it exactly.
+    """
+
+    def __init__(self, *run_params):
+        key = content_key(
+            *run_params,
+            *(f"{p}:{active_model(p)}" for p in ROUTER.providers()),
+            PROMPT_VERSION,
+        )
+        self.root = CACHE_DIR / "checkpoints" / key[:16]
+        self._lock = threading.Lock()
+
+    def load(self) -> dict:
+        if not self.root.exists():
+            return {}
+        saved = {}
+        for path in self.root.glob("*.json"):
             try:
-                story["analysis"] = analyze_story(story, article, comments)
-                t_ai = time.time() - t0
-                print(
-                    f"         ⏱  Scrape: {t_article:.1f}s | HN: {t_comments:.1f}s | AI: {t_ai:.1f}s"
-                )
-            except Exception as e:
-                print(f"         ⚠ Analysis error: {e}")
-                story["analysis"] = {
-                    "topic_category": "Others",
-                    "summary_paragraphs": [
-                        story.get("title", ""),
-                        "Analysis unavailable.",
-                    ],
-                    "highlight": "",
-                    "key_points": [],
-                    "sentiments": [],
-                }
-            time.sleep(2.0)  # stay within 15 RPM Free Tier limit
+                saved[path.stem] = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+        return saved
+
+    def save(self, story: dict) -> None:
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            path = self.root / f"{story.get('objectID')}.json"
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(
+                json.dumps(story["analysis"], ensure_ascii=False), encoding="utf-8"
+            )
+            os.replace(tmp, path)
 
-    # Only generate index.html, no archives or manifest.
-    (OUTPUT_DIR / "index.html").write_text(
-        build_index(stories, target, ranking), encoding="utf-8"
+    def clear(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def run_backfill(
+    start: date, end: date, rankings: list, n_stories: int, batch: bool = False
+):
+    """Generate every date in [start, end] over one shared pipeline.
+
+    Story lists for all dates and rankings are fetched up front; stories are
+    deduplicated by objectID and articles by URL, then everything goes
+    through a single process_stories() call so the scrape, comment and AI
+    pools stay busy across day boundaries. Each finished analysis is
+    checkpointed, so an interrupted backfill resumes where it stopped.
+    """
+    days = [start + timedelta(days=d) for d in range((end - start).days + 1)]
+    print(
+        f"  Backfill {start} → {end} ({len(days)} days)  Ranking={','.join(rankings)}"
+    )
+
+    print("  Fetching story lists...")
+    lists = fetch_story_lists(days, rankings, n_stories)
+    unique = {s.get("objectID"): s for listed in lists.values() for s in listed}
+
+    checkpoint = Checkpoint(str(start), str(end), ",".join(rankings), n_stories)
+    saved = checkpoint.load()
+    pending = []
+    for oid, story in unique.items():
+        if oid in saved:
+            story["analysis"] = saved[oid]
+        else:
+            pending.append(story)
+    print(
+        f"  {len(unique)} unique stories, {len(unique) - len(pending)} restored "
+        f"from checkpoint, {len(pending)} to analyse"
     )
-    print("  ✔ index.html (Data persistency removed)")
+    if pending:
+        process_stories(pending, batch=batch, on_done=checkpoint.save)
+
+    report_run_stats()
+    finish({r: [(d, lists[d, r]) for d in days] for r in rankings})
+    checkpoint.clear()
 
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--date", default=None)
-    ap.add_argument("--ranking", default="top", choices=list(RANKING_TAGS.keys()))
+    ap.add_argument(
+        "--from",
+        dest="date_from",
+        default=None,
+        help="backfill start date (YYYY-MM-DD); enables multi-day mode",
+    )
+    ap.add_argument(
+        "--to",
+        dest="date_to",
+        default=None,
+        help="backfill end date (default: yesterday)",
+    )
+    ap.add_argument(
+        "--ranking",
+        default="top",
+        help="one ranking or several, comma-separated, fetched and analysed in one "
+        f"pass ({', '.join(RANKING_TAGS)}); index.html follows the first",
+    )
     ap.add_argument("--stories", default=20, type=int)
+    ap.add_argument(
+        "--metrics-dir",
+        default=CONFIG.get("metrics_dir", "metrics"),
+        help="where to write run-report.json (per-stage timings and counters)",
+    )
+    ap.add_argument(
+        "--prometheus",
+        action="store_true",
+        help="also write hn_digest.prom for the node_exporter textfile collector",
+    )
+    ap.add_argument(
+        "--profile",
+        nargs="?",
+        const="profiles",
+        default=None,
+        metavar="DIR",
+        help="write cProfile (cpu.pstats) and wall-clock (wall.collapsed) "
+        "profiles of the run to DIR (default: profiles)",
+    )
+    ap.add_argument(
+        "--batch",
+        action="store_true",
+        default=CONFIG.get("batch_analysis", False),
+        help="analyse low-engagement stories several per LLM request",
+    )
+    cache = ap.add_mutually_exclusive_group()
+    cache.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="neither read nor write cached analyses, articles and HN items",
+    )
+    cache.add_argument(
+        "--refresh",
+        action="store_true",
+        help="re-analyse every story, update the cache",
+    )
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--rerender",
+        action="store_true",
+        help="rebuild pages for --date or --from/--to (default: every stored day) "
+        "from the story store, without network or LLM calls",
+    )
+    mode.add_argument(
+        "--rollup",
+        action="store_true",
+        help="print weekly rollups from the story store",
+    )
     args = ap.parse_args()
+    rankings = list(dict.fromkeys(r.strip() for r in args.ranking.split(",")))
+    unknown = [r for r in rankings if r not in RANKING_TAGS]
+    if unknown:
+        ap.error(f"unknown ranking: {', '.join(unknown)}")
 
-    target = (
-        date.fromisoformat(args.date) if args.date else date.today() - timedelta(days=1)
-    )
-    run(target, args.ranking, args.stories)
+    if args.no_cache:
+        for cache in (ANALYSIS_CACHE, ARTICLE_CACHE, ITEM_STORE):
+            cache.read = cache.write = False
+    elif args.refresh:
+        ANALYSIS_CACHE.read = False
+    if args.no_cache or args.refresh:
+        DEDUP["enabled"] = False
+
+    yesterday = date.today() - timedelta(days=1)
+    meta = {
+        "ranking": ",".join(rankings),
+        "stories": args.stories,
+        "batch": args.batch,
+        "provider": CONFIG["primary_provider"],
+        "model": active_model(),
+        "prompt_version": PROMPT_VERSION,
+        "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    if args.date_from:
+        start = date.fromisoformat(args.date_from)
+        end = date.fromisoformat(args.date_to) if args.date_to else yesterday
+        if end < start:
+            ap.error("--to must not be before --from")
+        meta.update({"from": str(start), "to": str(end)})
+    else:
+        target = date.fromisoformat(args.date) if args.date else yesterday
+        meta["date"] = str(target)
+
+    profiler = RunProfiler(Path(args.profile)) if args.profile else nullcontext()
+    try:
+        with profiler:
+            if args.rollup:
+                for ranking in rankings:
+                    print_rollup(ranking)
+            elif args.rerender:
+                if args.date_from:
+                    days = [
+                        start + timedelta(days=d) for d in range((end - start).days + 1)
+                    ]
+                else:
+                    days = [target] if args.date else None
+                rerender(days, rankings)
+            elif args.date_from:
+                run_backfill(start, end, rankings, args.stories, batch=args.batch)
+            else:
+                run(target, rankings, args.stories, batch=args.batch)
+    finally:
+        path = METRICS.write(Path(args.metrics_dir), meta, prometheus=args.prometheus)
+        print(f"  ✔ metrics → {path}")
 
 
 if __name__ == "__main__":